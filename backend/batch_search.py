@@ -0,0 +1,79 @@
+import threading
+import time
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+
+
+class _PendingSearch:
+    """대기 중인 단일 쿼리 검색 요청"""
+
+    __slots__ = ("query", "top_k", "done", "result", "error")
+
+    def __init__(self, query: np.ndarray, top_k: int):
+        self.query = query
+        self.top_k = top_k
+        self.done = threading.Event()
+        self.result: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.error: Optional[BaseException] = None
+
+
+class BatchingSearchClient:
+    """
+    여러 스레드에서 동시에 들어온 단일 쿼리 검색을 모아 한 번에 검색
+
+    첫 요청을 받은 스레드가 window초 동안 기다린 뒤 그동안 쌓인 쿼리를 (nq, d) 배열로 묶어
+    search_fn을 한 번만 호출하고, 결과를 요청별로 나누어 돌려줍니다. nq=1 검색을 여러 번 하는 것보다
+    인덱스를 한 번만 훑고 FAISS의 OpenMP 병렬화(쿼리 단위)를 활용할 수 있습니다.
+    """
+
+    def __init__(self, search_fn: Callable[[np.ndarray, int], Tuple[np.ndarray, np.ndarray]], window: float = 0.005):
+        """
+        Args:
+            search_fn: (queries, k) -> (distances, indices) 형태의 검색 함수 (예: index.search)
+            window: 요청을 모으는 시간(초)
+        """
+        self.search_fn = search_fn
+        self.window = window
+        self._pending: List[_PendingSearch] = []
+        self._lock = threading.Lock()
+
+    def search(self, query_embedding: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        단일 쿼리 검색
+
+        Args:
+            query_embedding: (1, dimension) float32 배열
+            top_k: 반환할 결과 개수
+
+        Returns:
+            (distances, indices) - 각각 (1, top_k) 배열 (index.search와 같은 형태)
+        """
+        request = _PendingSearch(query_embedding, top_k)
+        with self._lock:
+            self._pending.append(request)
+            leader = len(self._pending) == 1
+
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+            self._run(batch)
+        else:
+            request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run(self, batch: List[_PendingSearch]):
+        try:
+            queries = np.vstack([request.query for request in batch])
+            distances, indices = self.search_fn(queries, max(request.top_k for request in batch))
+            for row, request in enumerate(batch):
+                request.result = (distances[row:row + 1, :request.top_k], indices[row:row + 1, :request.top_k])
+        except BaseException as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
@@ -1,7 +1,36 @@
 import json
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Optional, Union
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # orjson 미설치 시 표준 json으로 대체
+    orjson = None
+
+
+def load_json(source: Union[str, Path, bytes]) -> Any:
+    """
+    JSON 파일 경로 또는 바이트를 파싱
+
+    orjson이 설치되어 있으면 텍스트 디코딩 없이 바이트를 바로 파싱하고,
+    없으면 표준 json 모듈을 사용합니다.
+
+    Args:
+        source: JSON 파일 경로 또는 JSON 바이트
+
+    Returns:
+        파싱된 객체
+
+    Raises:
+        FileNotFoundError: 파일이 없는 경우
+        json.JSONDecodeError: JSON 형식이 올바르지 않은 경우
+    """
+    raw = source if isinstance(source, (bytes, bytearray, memoryview)) else Path(source).read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 
 def parse_knowledge_json(json_path: str) -> List[Dict[str, Any]]:
     """
@@ -14,145 +43,135 @@ def parse_knowledge_json(json_path: str) -> List[Dict[str, Any]]:
         [{"text": "내용", "index": 0, "metadata": {...}}, ...]
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_json(json_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"JSON 파일을 찾을 수 없습니다: {json_path}")
     except json.JSONDecodeError as e:
         raise ValueError(f"JSON 파일 형식이 올바르지 않습니다: {e}")
     
-    chunks = []
-    chunk_index = 0
+    chunks: List[Dict[str, Any]] = []
     
-    # JSON 구조에 따라 다양한 형태 처리
+    # JSON 구조에 따라 다양한 형태 처리 (모든 청크는 하나의 리스트에 순서대로 추가)
     if isinstance(data, dict):
         # 단일 객체인 경우
-        chunks.extend(_process_dict_object(data, chunk_index))
-        chunk_index = len(chunks)
+        _process_dict_object(data, chunks)
         
     elif isinstance(data, list):
         # 배열인 경우
         for item in data:
             if isinstance(item, dict):
-                chunks.extend(_process_dict_object(item, chunk_index))
-                chunk_index = len(chunks)
+                _process_dict_object(item, chunks)
             elif isinstance(item, str):
                 # 문자열 배열인 경우
-                chunks.append({
-                    "text": item,
-                    "index": chunk_index,
-                    "metadata": {"type": "text_item"}
-                })
-                chunk_index += 1
+                chunks.append({"text": item, "index": len(chunks), "metadata": {"type": "text_item"}})
             else:
                 # 기타 타입은 문자열로 변환
-                chunks.append({
-                    "text": str(item),
-                    "index": chunk_index,
-                    "metadata": {"type": "converted_item"}
-                })
-                chunk_index += 1
+                chunks.append({"text": str(item), "index": len(chunks), "metadata": {"type": "converted_item"}})
                 
     else:
         # 기타 타입은 문자열로 변환
-        chunks.append({
-            "text": str(data),
-            "index": 0,
-            "metadata": {"type": "converted_data"}
-        })
+        chunks.append({"text": str(data), "index": 0, "metadata": {"type": "converted_data"}})
     
     return chunks
 
 
-def _process_dict_object(obj: Dict[str, Any], start_index: int) -> List[Dict[str, Any]]:
+def _leaf_metadata(
+    type: str, key: Optional[str], parent_key: Optional[str], array_index: Optional[int]
+) -> Dict[str, Any]:
+    """리프 청크 메타데이터 (값이 없는 parent_key/array_index는 생략)"""
+    if array_index is None:
+        metadata = {"type": type, "key": key, "source": "json"}
+    else:
+        metadata = {"type": type, "key": key, "array_index": array_index, "source": "json"}
+    if parent_key is not None:
+        metadata["parent_key"] = parent_key
+    return metadata
+
+
+# 순회 스택 프레임 종류
+_DICT_FRAME = 0
+_LIST_FRAME = 1
+
+
+def _process_dict_object(obj: Dict[str, Any], chunks: List[Dict[str, Any]]) -> None:
     """
     딕셔너리 객체를 처리하여 청크로 변환
+
+    재귀 호출 대신 (남은 항목 이터레이터, 경로 접두사, parent_key, array_index) 프레임을
+    스택에 쌓아 순회하므로 깊게 중첩된 JSON에서도 호출 스택을 소모하지 않으며,
+    청크 순서는 깊이 우선 순회 순서를 그대로 유지합니다.
+    parent_key/array_index는 최상위 키와 가장 바깥쪽 배열 인덱스를 유지합니다.
     
     Args:
         obj: 딕셔너리 객체
-        start_index: 시작 인덱스
-        
-    Returns:
-        청크 리스트
+        chunks: 청크를 추가할 리스트 (청크 인덱스는 이 리스트의 길이에서 이어짐)
     """
-    chunks = []
-    current_index = start_index
-    
-    for key, value in obj.items():
-        if isinstance(value, str):
-            # 문자열 값인 경우
-            if len(value.strip()) > 0:
-                chunks.append({
-                    "text": f"{key}: {value}",
-                    "index": current_index,
-                    "metadata": {
-                        "type": "key_value",
-                        "key": key,
-                        "source": "json"
-                    }
-                })
-                current_index += 1
-                
-        elif isinstance(value, dict):
-            # 중첩된 딕셔너리인 경우
-            nested_chunks = _process_dict_object(value, current_index)
-            for chunk in nested_chunks:
-                chunk["metadata"]["parent_key"] = key
-                chunk["text"] = f"{key} > {chunk['text']}"
-            chunks.extend(nested_chunks)
-            current_index += len(nested_chunks)
-            
-        elif isinstance(value, list):
-            # 배열 값인 경우
-            for i, item in enumerate(value):
+    current_index = len(chunks)
+    stack = deque([(_DICT_FRAME, iter(obj.items()), "", None, None, None)])
+
+    while stack:
+        frame_type, items, prefix, parent_key, array_index, list_key = stack[-1]
+
+        if frame_type == _DICT_FRAME:
+            for key, value in items:
+                if isinstance(value, str):
+                    # 문자열 값인 경우
+                    if len(value.strip()) > 0:
+                        chunks.append({
+                            "text": f"{prefix}{key}: {value}", "index": current_index,
+                            "metadata": _leaf_metadata("key_value", key, parent_key, array_index),
+                        })
+                        current_index += 1
+
+                elif isinstance(value, dict):
+                    # 중첩된 딕셔너리인 경우: 하위 객체를 먼저 처리하고 남은 키로 복귀
+                    stack.append((
+                        _DICT_FRAME, iter(value.items()), f"{prefix}{key} > ",
+                        key if parent_key is None else parent_key, array_index, None,
+                    ))
+                    break
+
+                elif isinstance(value, list):
+                    # 배열 값인 경우
+                    stack.append((_LIST_FRAME, enumerate(value), prefix, parent_key, array_index, key))
+                    break
+
+                else:
+                    # 기타 타입은 문자열로 변환
+                    chunks.append({
+                        "text": f"{prefix}{key}: {str(value)}", "index": current_index,
+                        "metadata": _leaf_metadata("converted_value", key, parent_key, array_index),
+                    })
+                    current_index += 1
+            else:
+                stack.pop()
+
+        else:
+            key = list_key
+            for i, item in items:
+                item_array_index = i if array_index is None else array_index
                 if isinstance(item, str) and len(item.strip()) > 0:
                     chunks.append({
-                        "text": f"{key}[{i}]: {item}",
-                        "index": current_index,
-                        "metadata": {
-                            "type": "array_item",
-                            "key": key,
-                            "array_index": i,
-                            "source": "json"
-                        }
+                        "text": f"{prefix}{key}[{i}]: {item}", "index": current_index,
+                        "metadata": _leaf_metadata("array_item", key, parent_key, item_array_index),
                     })
                     current_index += 1
                 elif isinstance(item, dict):
                     # 배열 내 딕셔너리인 경우
-                    nested_chunks = _process_dict_object(item, current_index)
-                    for chunk in nested_chunks:
-                        chunk["metadata"]["parent_key"] = key
-                        chunk["metadata"]["array_index"] = i
-                        chunk["text"] = f"{key}[{i}] > {chunk['text']}"
-                    chunks.extend(nested_chunks)
-                    current_index += len(nested_chunks)
+                    stack.append((
+                        _DICT_FRAME, iter(item.items()), f"{prefix}{key}[{i}] > ",
+                        key if parent_key is None else parent_key, item_array_index, None,
+                    ))
+                    break
                 else:
                     # 기타 타입은 문자열로 변환
                     chunks.append({
-                        "text": f"{key}[{i}]: {str(item)}",
-                        "index": current_index,
-                        "metadata": {
-                            "type": "array_converted",
-                            "key": key,
-                            "array_index": i,
-                            "source": "json"
-                        }
+                        "text": f"{prefix}{key}[{i}]: {str(item)}", "index": current_index,
+                        "metadata": _leaf_metadata("array_converted", key, parent_key, item_array_index),
                     })
                     current_index += 1
-        else:
-            # 기타 타입은 문자열로 변환
-            chunks.append({
-                "text": f"{key}: {str(value)}",
-                "index": current_index,
-                "metadata": {
-                    "type": "converted_value",
-                    "key": key,
-                    "source": "json"
-                }
-            })
-            current_index += 1
-    
-    return chunks
+            else:
+                stack.pop()
 
 
 def validate_knowledge_json(json_path: str) -> bool:
@@ -166,8 +185,7 @@ def validate_knowledge_json(json_path: str) -> bool:
         유효하면 True, 아니면 False
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            json.load(f)
+        load_json(json_path)
         return True
     except (FileNotFoundError, json.JSONDecodeError):
         return False
@@ -184,9 +202,8 @@ def get_json_structure_info(json_path: str) -> Dict[str, Any]:
         구조 정보 딕셔너리
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
+        data = load_json(json_path)
+
         info = {
             "file_path": json_path,
             "file_size": Path(json_path).stat().st_size,
@@ -214,45 +231,54 @@ def get_json_structure_info(json_path: str) -> Dict[str, Any]:
         }
 
 
-def _analyze_dict_structure(obj: Dict[str, Any], max_depth: int = 3, current_depth: int = 0) -> Dict[str, Any]:
-    """딕셔너리 구조 분석"""
-    if current_depth >= max_depth:
-        return {"type": "dict", "truncated": True}
-    
-    structure = {"type": "dict", "keys": {}}
-    for key, value in obj.items():
+def _structure_node(value: Any, depth: int, max_depth: int, stack: deque) -> Dict[str, Any]:
+    """값 하나의 구조 노드를 만들고, 하위 분석이 필요하면 작업 스택에 추가"""
+    if isinstance(value, dict):
+        if depth >= max_depth:
+            return {"type": "dict", "truncated": True}
+        node = {"type": "dict", "keys": {}}
+        stack.append((value, depth, node))
+        return node
+
+    if isinstance(value, list):
+        if depth >= max_depth:
+            return {"type": "list", "length": len(value), "truncated": True}
+        if not value:
+            return {"type": "list", "length": 0, "empty": True}
+        # 첫 번째 요소의 타입을 기준으로 분석
+        node = {"type": "list", "length": len(value), "item_type": type(value[0]).__name__}
+        if isinstance(value[0], (dict, list)):
+            stack.append((value, depth, node))
+        return node
+
+    return {
+        "type": type(value).__name__,
+        "length": len(str(value)) if hasattr(value, '__len__') else 0
+    }
+
+
+def _analyze_structure(obj: Any, max_depth: int, current_depth: int) -> Dict[str, Any]:
+    """작업 스택으로 dict/list 구조를 재귀 없이 분석"""
+    stack: deque = deque()
+    structure = _structure_node(obj, current_depth, max_depth, stack)
+
+    while stack:
+        value, depth, node = stack.pop()
         if isinstance(value, dict):
-            structure["keys"][key] = _analyze_dict_structure(value, max_depth, current_depth + 1)
-        elif isinstance(value, list):
-            structure["keys"][key] = _analyze_list_structure(value, max_depth, current_depth + 1)
+            keys = node["keys"]
+            for key, item in value.items():
+                keys[key] = _structure_node(item, depth + 1, max_depth, stack)
         else:
-            structure["keys"][key] = {
-                "type": type(value).__name__,
-                "length": len(str(value)) if hasattr(value, '__len__') else 0
-            }
-    
+            node["item_structure"] = _structure_node(value[0], depth + 1, max_depth, stack)
+
     return structure
 
 
+def _analyze_dict_structure(obj: Dict[str, Any], max_depth: int = 3, current_depth: int = 0) -> Dict[str, Any]:
+    """딕셔너리 구조 분석"""
+    return _analyze_structure(obj, max_depth, current_depth)
+
+
 def _analyze_list_structure(obj: List[Any], max_depth: int = 3, current_depth: int = 0) -> Dict[str, Any]:
     """리스트 구조 분석"""
-    if current_depth >= max_depth:
-        return {"type": "list", "length": len(obj), "truncated": True}
-    
-    if not obj:
-        return {"type": "list", "length": 0, "empty": True}
-    
-    # 첫 번째 요소의 타입을 기준으로 분석
-    first_item = obj[0]
-    structure = {
-        "type": "list",
-        "length": len(obj),
-        "item_type": type(first_item).__name__
-    }
-    
-    if isinstance(first_item, dict):
-        structure["item_structure"] = _analyze_dict_structure(first_item, max_depth, current_depth + 1)
-    elif isinstance(first_item, list):
-        structure["item_structure"] = _analyze_list_structure(first_item, max_depth, current_depth + 1)
-    
-    return structure
+    return _analyze_structure(obj, max_depth, current_depth)
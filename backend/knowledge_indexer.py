@@ -1,54 +1,107 @@
 import os
-import re
-import json
+import mmap
 import argparse
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Iterable, Iterator, List, Optional, Union
+from backend.json_parser import load_json
 from backend.vectorstore import VectorStore
 
+try:
+    import simdjson
+except ImportError:  # pysimdjson 미설치 시 전체 트리 파싱으로 대체
+    simdjson = None
+
 # 실행방법
 # python -m backend.knowledge_indexer --in-dir ./data/knowledge --out ./data/knowledge/merged.txt --build-index --index-out ./data/knowledge_vectorstore
 
+# 전체 JSON 크기가 이 값보다 작으면 프로세스 기동 비용이 더 커서 스레드 풀 사용
+PROCESS_POOL_MIN_BYTES = 32 * 1024 * 1024
+
+# simdjson 프록시 객체(Object/Array)도 dict/list와 동일하게 순회
+if simdjson is not None:
+    _OBJECT_TYPES = (dict, simdjson.Object)
+    _ARRAY_TYPES = (list, simdjson.Array)
+else:
+    _OBJECT_TYPES = (dict,)
+    _ARRAY_TYPES = (list,)
+
+
+def _as_items(node) -> Iterable:
+    """배열이면 그대로, 객체면 단일 항목으로 취급"""
+    if isinstance(node, _ARRAY_TYPES):
+        return node
+    if isinstance(node, _OBJECT_TYPES):
+        return (node,)
+    return ()
+
+
+def _iter_ko_txt(payload) -> Iterator[str]:
+    """corpus -> ko_info -> ko_txt 값들을 앞뒤 공백을 제거해 순서대로 반환"""
+    for item in _as_items(payload):
+        if not isinstance(item, _OBJECT_TYPES):
+            continue
+        for entry in _as_items(item.get("corpus")):
+            if not isinstance(entry, _OBJECT_TYPES):
+                continue
+            for ko_info in _as_items(entry.get("ko_info")):
+                if not isinstance(ko_info, _OBJECT_TYPES):
+                    continue
+                value = ko_info.get("ko_txt")
+                if isinstance(value, str) and (value := value.strip()):
+                    yield value
+
+
 def _extract_ko_txt(payload: Union[dict, list]) -> str:
     """
     JSON payload에서 corpus -> ko_info -> ko_txt 값들만 수집해 하나의 문자열로 병합.
     파일 하나당 반환 문자열 1개.
     """
-    parts: List[str] = []
-
-    def add(value: Optional[str]):
-        if isinstance(value, str) and value.strip():
-            parts.append(value.strip())
-
-    def walk_ko_info(ko_info: Union[list, dict]):
-        if isinstance(ko_info, list):
-            for item in ko_info:
-                if isinstance(item, dict):
-                    add(item.get("ko_txt"))
-        elif isinstance(ko_info, dict):
-            add(ko_info.get("ko_txt"))
-
-    def walk_corpus(corpus: Union[list, dict]):
-        if isinstance(corpus, list):
-            for entry in corpus:
-                if isinstance(entry, dict) and "ko_info" in entry:
-                    walk_ko_info(entry.get("ko_info"))
-        elif isinstance(corpus, dict):
-            if "ko_info" in corpus:
-                walk_ko_info(corpus.get("ko_info"))
-
-    if isinstance(payload, dict) and "corpus" in payload:
-        walk_corpus(payload.get("corpus"))
-    elif isinstance(payload, list):
-        for item in payload:
-            if isinstance(item, dict) and "corpus" in item:
-                walk_corpus(item.get("corpus"))
-
-    return "\n".join(parts)
-
-
-def read_all_json_files(input_dir: str) -> List[str]:
-    contents: List[str] = []
+    return "\n".join(_iter_ko_txt(payload))
+
+
+def _read_ko_txt(fp: Path, parser=None) -> str:
+    """
+    JSON 파일 하나에서 ko_txt를 추출.
+    simdjson 파서가 주어지면 필요한 필드만 지연 접근하여 전체 트리를 파이썬 객체로 만들지 않습니다.
+    """
+    raw = fp.read_bytes()
+    if not raw.strip():
+        return ""
+    payload = parser.parse(raw) if parser is not None else load_json(raw)
+    # 프록시 객체는 함수 종료 시 해제되어야 다음 파일에서 파서를 재사용할 수 있음
+    return _extract_ko_txt(payload)
+
+
+_thread_state = threading.local()
+
+
+def _get_parser():
+    """워커(스레드/프로세스)별 simdjson 파서를 하나씩 생성해 재사용"""
+    if simdjson is None:
+        return None
+    parser = getattr(_thread_state, "parser", None)
+    if parser is None:
+        parser = _thread_state.parser = simdjson.Parser()
+    return parser
+
+
+def _process_one_file(fp: Path) -> str:
+    try:
+        return _read_ko_txt(fp, _get_parser())
+    except Exception as e:
+        print(f"⚠️ 파일 처리 실패: {fp} -> {e}")
+        return ""
+
+
+def read_all_json_files(input_dir: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    입력 디렉토리의 모든 JSON 파일에서 ko_txt를 병렬로 추출합니다.
+    결과 순서는 파일 경로 정렬 순서를 유지합니다.
+    """
     root = Path(input_dir)
     if not root.exists() or not root.is_dir():
         raise FileNotFoundError(f"입력 디렉토리를 찾을 수 없습니다: {input_dir}")
@@ -57,19 +110,26 @@ def read_all_json_files(input_dir: str) -> List[str]:
     if not json_files:
         raise FileNotFoundError(f"JSON 파일을 찾을 수 없습니다: {input_dir}")
 
-    for fp in json_files:
-        try:
-            raw = fp.read_text(encoding="utf-8")
-            if not raw.strip():
-                continue
-            payload = json.loads(raw)
-            merged_ko = _extract_ko_txt(payload)
-            if merged_ko.strip():
-                contents.append(merged_ko)
-        except Exception as e:
-            print(f"⚠️ 파일 처리 실패: {fp} -> {e}")
+    max_workers = max_workers or os.cpu_count() or 1
+    total_bytes = sum(fp.stat().st_size for fp in json_files)
+
+    if max_workers == 1 or len(json_files) == 1:
+        results = map(_process_one_file, json_files)
+        return [merged_ko for merged_ko in results if merged_ko.strip()]
 
-    return contents
+    if total_bytes >= PROCESS_POOL_MIN_BYTES:
+        # fork는 스레드가 떠 있는 프로세스(torch/OpenMP 등)에서 잠긴 락을 그대로 복제해 교착될 수 있으므로
+        # 새 인터프리터로 워커를 시작
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        map_kwargs = {"chunksize": 8}
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        map_kwargs = {}
+
+    with executor:
+        # map은 입력 순서대로 결과를 반환하므로 병합 순서가 결정적
+        results = executor.map(_process_one_file, json_files, **map_kwargs)
+        return [merged_ko for merged_ko in results if merged_ko.strip()]
 
 
 def write_merged_file(docs: List[str], output_file: str) -> None:
@@ -81,29 +141,90 @@ def write_merged_file(docs: List[str], output_file: str) -> None:
     print(f"✅ 병합 완료: {len(docs)}개 파일 -> {output_file}")
 
 
+def _normalize_newlines(text: str) -> str:
+    """텍스트 모드로 읽을 때(universal newlines)와 같이 \r\n, \r을 \n으로 변환"""
+    if "\r" not in text:
+        return text
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _iter_text_segments(text: str) -> Iterator[str]:
+    """text.split("\n\n")과 같은 구간을 중간 리스트 없이 str.find로 하나씩 반환"""
+    size = len(text)
+    pos = 0
+    while pos <= size:
+        end = text.find("\n\n", pos)
+        if end == -1:
+            end = size
+        yield text[pos:end]
+        pos = end + 2
+
+
+def _iter_merged_segments(merged_path: Union[str, os.PathLike]) -> Iterator[str]:
+    """
+    merged.txt를 mmap으로 열어 두 줄바꿈 사이 구간을 하나씩 디코딩해 반환.
+    파일 전체를 str로 읽지 않으므로 큰 파일에서도 전체 크기의 복사본이 생기지 않습니다.
+    (text.split("\n\n")과 같은 구간을 반환)
+    """
+    with open(merged_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b"\r") != -1:
+                # CRLF(Windows에서 쓴 파일)는 텍스트 모드의 줄바꿈 변환을 그대로 따름
+                with open(merged_path, "r", encoding="utf-8") as text_file:
+                    yield from _iter_text_segments(text_file.read())
+                return
+
+            size = len(mm)
+            pos = 0
+            while pos <= size:
+                end = mm.find(b"\n\n", pos)
+                if end == -1:
+                    end = size
+                yield mm[pos:end].decode("utf-8")
+                pos = end + 2
+
+
+@functools.lru_cache(maxsize=4)
+def _get_embedding_model(model_name: str, cache_dir: Optional[str]):
+    """
+    (모델명, 캐시 디렉토리)별 임베딩 모델을 한 번만 로드하여 재사용.
+    인덱스/청크를 가진 VectorStore는 캐시하지 않으므로 호출마다 새로 만들어집니다.
+    """
+    return VectorStore(model_name=model_name, cache_folder=cache_dir).model
+
+
 def build_index_from_merged(
-    merged_path: str = "./data/knowledge/merged.txt",
+    merged_path: Union[str, os.PathLike, List[str]] = "./data/knowledge/merged.txt",
     output_dir: str = "./data/knowledge_vectorstore",
     model_name: str = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
     cache_dir: Optional[str] = os.environ.get("EMBEDDING_CACHE_DIR", "./models"),
 ):
     """
     merged.txt를 두 줄바꿈(연속 개수 무관) 기준으로 청크로 나누어 벡터 인덱스를 생성합니다.
+
+    merged_path 대신 read_all_json_files()가 반환한 문서 리스트를 넘기면 merged.txt를 쓰고 다시 읽지 않고
+    같은 기준으로 바로 청크화합니다. (문서 사이 구분도 두 줄바꿈이므로 결과 청크는 동일)
     """
-    if not os.path.exists(merged_path):
-        raise FileNotFoundError(f"병합 파일을 찾을 수 없습니다: {merged_path}")
+    if isinstance(merged_path, (str, os.PathLike)):
+        if not os.path.exists(merged_path):
+            raise FileNotFoundError(f"병합 파일을 찾을 수 없습니다: {merged_path}")
 
-    with open(merged_path, "r", encoding="utf-8") as f:
-        text = f.read()
+        segments = _iter_merged_segments(merged_path)
+    else:
+        # merged.txt를 텍스트 모드로 다시 읽던 경로와 같게 CRLF/CR을 먼저 정리해야 청크 경계가 같음
+        segments = (seg for text in merged_path for seg in _iter_text_segments(_normalize_newlines(text)))
 
     # 두 줄 이상의 줄바꿈을 구분자로 사용하여 분리
-    parts = [seg.strip() for seg in re.split(r"\n{2,}", text) if seg.strip()]
+    # ("\n{2,}" 정규식 분리와 동일: 세 줄 이상일 때 남는 줄바꿈은 strip()이 제거)
+    parts = [part for seg in segments if (part := seg.strip())]
     chunks = [{"text": seg, "index": i} for i, seg in enumerate(parts)]
 
     if not chunks:
-        raise ValueError("생성된 청크가 없습니다. merged.txt 내용을 확인하세요.")
+        raise ValueError("생성된 청크가 없습니다. 입력 문서 내용을 확인하세요.")
 
-    store = VectorStore(model_name=model_name, cache_folder=cache_dir)
+    store = VectorStore(model_name=model_name, model=_get_embedding_model(model_name, cache_dir))
     store.create_index(chunks)
 
     os.makedirs(output_dir, exist_ok=True)
@@ -111,28 +232,32 @@ def build_index_from_merged(
     print(f"✅ 인덱스 생성 완료: {len(chunks)}개 청크 -> {output_dir}")
 
 
-def main():
-    parser = argparse.ArgumentParser(description="data/knowledge의 모든 JSON 병합 및(옵션) merged.txt 인덱싱")
+def main(argv: Optional[List[str]] = None, **overrides):
+    """
+    CLI 진입점
+
+    Args:
+        argv: 명령행 인자 (None이면 sys.argv 사용)
+        overrides: 코드에서 호출할 때 덮어쓸 옵션 값 (예: main([], in_dir="...", build_index=True))
+    """
+    parser = argparse.ArgumentParser(description="data/knowledge의 모든 JSON 병합 또는 벡터 인덱싱")
     parser.add_argument("--in-dir", default="./data/knowledge", help="입력 디렉토리 (기본: ./data/knowledge)")
     parser.add_argument("--out", default="./data/knowledge/merged.txt", help="출력 파일 경로 (기본: ./data/knowledge/merged.txt)")
-    parser.add_argument("--build-index", action="store_true", help="merged.txt를 두 줄바꿈 기준으로 청크화하여 벡터 인덱스 생성")
+    parser.add_argument("--build-index", action="store_true", help="추출한 문서를 두 줄바꿈 기준으로 바로 청크화하여 벡터 인덱스 생성 (merged.txt는 쓰지 않음)")
     parser.add_argument("--index-out", default="./data/knowledge_vectorstore", help="인덱스 저장 경로 (기본: ./data/knowledge_vectorstore)")
     parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2"), help="SentenceTransformer 모델명")
     parser.add_argument("--cache", default=os.environ.get("EMBEDDING_CACHE_DIR", "./models"), help="임베딩 모델 캐시 디렉토리")
 
-    args = parser.parse_args()
-
-    in_dir = args["in_dir"] if isinstance(args, dict) else args.in_dir
-    out_file = args["out"] if isinstance(args, dict) else args.out
+    args = parser.parse_args(argv)
+    vars(args).update(overrides)
 
-    docs = read_all_json_files(in_dir)
-    write_merged_file(docs, out_file)
+    docs = read_all_json_files(args.in_dir)
 
-    if args["build_index"] if isinstance(args, dict) else args.build_index:
-        index_out = args["index_out"] if isinstance(args, dict) else args.index_out
-        model_name = args["model"] if isinstance(args, dict) else args.model
-        cache_dir = args["cache"] if isinstance(args, dict) else args.cache
-        build_index_from_merged(out_file, output_dir=index_out, model_name=model_name, cache_dir=cache_dir)
+    if args.build_index:
+        # merged.txt를 디스크에 쓰고 다시 읽는 대신 추출한 문서로 바로 인덱싱
+        build_index_from_merged(docs, output_dir=args.index_out, model_name=args.model, cache_dir=args.cache)
+    else:
+        write_merged_file(docs, args.out)
 
 
 if __name__ == "__main__":
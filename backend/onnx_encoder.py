@@ -0,0 +1,133 @@
+import os
+import json
+import argparse
+import numpy as np
+from typing import List, Optional
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+except ImportError:  # onnxruntime/tokenizers는 선택 의존성 (없으면 SentenceTransformer 사용)
+    ort = None
+    Tokenizer = None
+
+# 실행방법
+# 1) ONNX 변환: optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 --optimize O3 ./models/onnx_miniLM
+# 2) INT8 양자화: python -m backend.onnx_encoder --onnx-dir ./models/onnx_miniLM
+# 3) 사용: EMBEDDING_ONNX_DIR=./models/onnx_miniLM (또는 VectorStore(onnx_model_dir=...))
+
+ONNX_MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+# all-MiniLM-L6-v2의 max_seq_length와 동일 (더 긴 입력은 잘라냄)
+MAX_SEQ_LENGTH = 256
+
+
+class OnnxEncoder:
+    """
+    ONNX Runtime 기반 문장 임베딩 모델
+
+    SentenceTransformer.encode와 같은 형태로 호출할 수 있으며, 토큰 임베딩을
+    attention mask 기준으로 평균 풀링한 뒤 L2 정규화한 float32 배열을 반환합니다.
+    """
+
+    def __init__(self, model_dir: str, max_seq_length: int = MAX_SEQ_LENGTH):
+        """
+        Args:
+            model_dir: optimum-cli로 변환한 모델 디렉토리 (model.onnx, tokenizer.json, config.json)
+            max_seq_length: 최대 토큰 길이
+        """
+        if ort is None:
+            raise ImportError("ONNX 임베딩을 사용하려면 onnxruntime과 tokenizers를 설치하세요.")
+
+        # 양자화 모델이 있으면 우선 사용
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {inp.name for inp in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        with open(os.path.join(model_dir, "config.json"), encoding="utf-8") as f:
+            self.dimension = json.load(f)["hidden_size"]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        텍스트 임베딩
+
+        Args:
+            texts: 텍스트 리스트
+            batch_size: 한 번에 추론할 문장 수
+            kwargs: SentenceTransformer 호환용 인자 (show_progress_bar 등, 무시됨)
+
+        Returns:
+            (N, dimension) L2 정규화된 float32 배열
+        """
+        # 길이순으로 묶어 배치마다 패딩 토큰을 최소화하고, 결과는 원래 순서 위치에 기록
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([texts[i] for i in rows])
+        return embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        # last_hidden_state: (batch, seq, dimension)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # 패딩 토큰을 제외한 평균 풀링
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+
+def quantize_model(model_dir: str) -> str:
+    """
+    model.onnx를 INT8 동적 양자화하여 model_quantized.onnx로 저장
+
+    Args:
+        model_dir: optimum-cli로 변환한 모델 디렉토리
+
+    Returns:
+        양자화된 모델 파일 경로
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    src = os.path.join(model_dir, ONNX_MODEL_FILE)
+    dst = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+    print(f"✅ INT8 양자화 완료: {dst}")
+    return dst
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI 진입점"""
+    parser = argparse.ArgumentParser(description="ONNX 임베딩 모델 INT8 동적 양자화")
+    parser.add_argument("--onnx-dir", default=os.environ.get("EMBEDDING_ONNX_DIR", "./models/onnx_miniLM"), help="optimum-cli로 변환한 모델 디렉토리")
+
+    args = parser.parse_args(argv)
+    quantize_model(args.onnx_dir)
+
+
+if __name__ == "__main__":
+    main()
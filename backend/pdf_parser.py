@@ -1,16 +1,149 @@
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 import pdfplumber
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
 
+try:
+    import fitz  # PyMuPDF
+except ImportError:  # PyMuPDF는 선택 의존성 (없으면 pdfplumber 사용)
+    fitz = None
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """PDF에서 텍스트 추출"""
-    text = ""
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pypdfium2는 선택 의존성 (없으면 pdfplumber 사용)
+    pdfium = None
+
+try:
+    from numba import njit
+except ImportError:  # numba는 선택 의존성 (없으면 NumPy 벡터 연산 사용)
+    njit = None
+
+# 워커 하나가 처리할 최소 페이지 수 (이보다 적으면 프로세스 기동 비용이 더 큼)
+PAGES_PER_WORKER = 8
+
+# PDFium은 스레드 안전하지 않으므로(ctypes 호출 중 GIL도 풀림) 프로세스 전체에서 호출을 직렬화
+# (GC가 락을 잡은 스레드에서 버려진 추출 제너레이터를 닫아도 교착되지 않도록 재진입 가능 락 사용)
+_PDFIUM_LOCK = threading.RLock()
+
+
+def _extract_page_range(pdf_path: str, page_numbers: Optional[List[int]] = None) -> List[str]:
+    """지정한 페이지(1부터 시작)의 텍스트 추출 - 프로세스 풀 워커에서 실행"""
+    with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def _iter_pages_pdfplumber(pdf_path: str, max_workers: Optional[int] = None) -> Iterator[str]:
+    """
+    pdfplumber로 페이지별 텍스트 추출
+
+    페이지가 많으면 페이지 구간을 나누어 여러 프로세스에서 동시에 추출합니다.
+    (pdfplumber/pdfminer는 순수 파이썬이라 스레드로는 GIL 때문에 병렬화되지 않음)
+    """
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text
+        num_pages = len(pdf.pages)
+        workers = min(max_workers or os.cpu_count() or 1, num_pages // PAGES_PER_WORKER)
+        if workers <= 1:
+            for page in pdf.pages:
+                yield page.extract_text() or ""
+            return
+
+    # 연속된 페이지 구간으로 나누어 map의 결과 순서 = 페이지 순서 (앞 구간부터 끝나는 대로 반환)
+    page_numbers = list(range(1, num_pages + 1))
+    batch_size = -(-num_pages // workers)
+    batches = [page_numbers[i:i + batch_size] for i in range(0, num_pages, batch_size)]
+    # fork는 스레드가 떠 있는 프로세스(Streamlit 서버, torch/OpenMP, 인덱싱 백그라운드 스레드)에서
+    # 잠긴 락을 그대로 복제해 교착될 수 있으므로 새 인터프리터로 워커를 시작
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for batch in executor.map(_extract_page_range, repeat(pdf_path), batches):
+            yield from batch
+
+
+def _iter_pages_fitz(pdf_path: str) -> Iterator[str]:
+    """PyMuPDF(MuPDF C 라이브러리)로 페이지별 평문 텍스트 추출"""
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            # pdfplumber와 동일하게 페이지 끝 줄바꿈은 제외 (페이지 구분은 결합 시 추가)
+            yield page.get_text("text").rstrip("\n")
+
+
+def _iter_pages_pdfium(pdf_path: str) -> Iterator[str]:
+    """
+    pypdfium2(PDFium C++ 라이브러리)로 페이지별 평문 텍스트 추출
+
+    여러 세션이 동시에 업로드해도 PDFium을 한 번에 한 스레드만 호출하도록 문서 열기/페이지 추출/닫기마다
+    락을 잡고, 추출한 페이지는 락 밖에서 바로 반환합니다. (다른 문서의 추출과 페이지 단위로 번갈아 진행)
+    """
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        with _PDFIUM_LOCK:
+            num_pages = len(pdf)
+        for i in range(num_pages):
+            with _PDFIUM_LOCK:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+            # PDFium은 줄바꿈을 \r\n(가끔 \r 단독)으로, 줄끝 하이픈 분철은 하이픈과 줄바꿈을 합쳐 U+FFFE 한 글자로
+            # 반환하므로 다른 백엔드(pdfplumber/PyMuPDF)와 같게 "\n", "-\n"으로 되돌림
+            text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\ufffe", "-\n")
+            yield text.rstrip("\n")
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+
+def iter_pdf_pages(pdf_path: str, max_workers: Optional[int] = None) -> Iterator[str]:
+    """
+    PDF 페이지 텍스트를 앞 페이지부터 차례로 반환
+
+    네이티브 라이브러리 기반 백엔드를 우선 사용합니다. (PyMuPDF > pypdfium2 > pdfplumber)
+    """
+    if fitz is not None:
+        return _iter_pages_fitz(pdf_path)
+    if pdfium is not None:
+        return _iter_pages_pdfium(pdf_path)
+    return _iter_pages_pdfplumber(pdf_path, max_workers)
+
+
+def extract_text_from_pdf(pdf_path: str, max_workers: Optional[int] = None) -> str:
+    """PDF에서 텍스트 추출"""
+    # 페이지마다 += 로 이어 붙이지 않고 한 번에 결합
+    return "".join(text + "\n" for text in iter_pdf_pages(pdf_path, max_workers) if text)
+
+
+def _span_kernel(n: int, chunk_size: int, overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """길이 n 텍스트의 청크 (start, end) 구간 계산 - 문자열을 다루지 않는 순수 산술 루프"""
+    step = chunk_size - overlap
+    count = (n + step - 1) // step if n > 0 else 0
+    starts = np.empty(count, dtype=np.int64)
+    ends = np.empty(count, dtype=np.int64)
+    for i in range(count):
+        starts[i] = i * step
+        ends[i] = min(i * step + chunk_size, n)
+    return starts, ends
+
+
+def _span_vectorized(n: int, chunk_size: int, overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """_span_kernel과 동일한 구간을 NumPy로 한 번에 계산"""
+    starts = np.arange(0, n, chunk_size - overlap, dtype=np.int64)
+    ends = np.minimum(starts + chunk_size, n)
+    return starts, ends
+
+
+if njit is not None:
+    # 시그니처를 지정해 import 시점에 컴파일하고, 컴파일 결과는 디스크에 캐시
+    _compute_spans = njit("Tuple((i8[:], i8[:]))(i8, i8, i8)", cache=True)(_span_kernel)
+else:
+    _compute_spans = _span_vectorized
 
 
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[dict]:
@@ -25,18 +158,63 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[dict
     Returns:
         [{"text": "청크 내용", "index": 0}, ...]
     """
-    chunks = []
-    start = 0
+    if overlap >= chunk_size:
+        raise ValueError(f"overlap({overlap})은 chunk_size({chunk_size})보다 작아야 합니다.")
 
-    while start < len(text):
-        end = start + chunk_size
-        chunk_text = text[start:end]
+    starts, ends = _compute_spans(len(text), chunk_size, overlap)
 
-        if chunk_text.strip():  # 빈 청크 제외
+    chunks = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        piece = text[start:end]
+        if not piece.isspace():  # 공백뿐인 청크 제외 (strip 사본을 만들지 않음)
             chunks.append(
-                {"text": chunk_text, "index": len(chunks), "start": start, "end": end}
+                {"text": piece, "index": len(chunks), "start": start, "end": end}
             )
 
-        start = end - overlap
-
     return chunks
+
+
+def iter_chunks(pages: Iterable[str], chunk_size: int = 500, overlap: int = 50) -> Iterator[dict]:
+    """
+    페이지 텍스트를 받는 대로 청크로 나누기
+
+    chunk_text(extract_text_from_pdf(...))와 같은 청크를 만들지만, 전체 텍스트를 기다리지 않고
+    채워진 청크부터 바로 반환합니다. (남은 꼬리 글자만 다음 페이지와 이어 붙임)
+
+    Args:
+        pages: 페이지별 텍스트 (iter_pdf_pages 결과)
+        chunk_size: 청크당 글자 수
+        overlap: 청크 간 중복 글자 수
+
+    Yields:
+        {"text": "청크 내용", "index": 0, "start": 0, "end": 500}
+    """
+    if overlap >= chunk_size:
+        raise ValueError(f"overlap({overlap})은 chunk_size({chunk_size})보다 작아야 합니다.")
+
+    step = chunk_size - overlap
+    buffer = ""  # 아직 청크로 내보내지 않은 텍스트
+    offset = 0  # buffer[0]의 전체 텍스트 기준 위치
+    index = 0
+
+    def take(final: bool) -> Iterator[dict]:
+        nonlocal buffer, offset, index
+        starts, ends = _compute_spans(len(buffer), chunk_size, overlap)
+        if not final:
+            # 마지막이 아니면 chunk_size를 다 채운 청크만 내보냄 (나머지는 다음 페이지와 이어 붙여 다시 계산)
+            count = int(np.searchsorted(starts, len(buffer) - chunk_size, side="right"))
+            starts, ends = starts[:count], ends[:count]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            piece = buffer[start:end]
+            if not piece.isspace():
+                yield {"text": piece, "index": index, "start": offset + start, "end": offset + end}
+                index += 1
+        consumed = len(starts) * step
+        buffer = buffer[consumed:]
+        offset += consumed
+
+    for text in pages:
+        if text:
+            buffer += text + "\n"
+            yield from take(final=False)
+    yield from take(final=True)
@@ -1,14 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import numpy as np
 from anthropic import Anthropic
-from typing import Dict, Optional
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+# 배경지식/사용자 PDF 인덱스 동시 검색용 (FAISS는 검색 중 GIL을 해제함), 모든 세션이 공유
+_search_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="qna-search")
+
+
+def _split_prompt(template: str) -> Tuple[str, str, str]:
+    """프롬프트 템플릿을 {context}, {question} 자리를 기준으로 (앞, 가운데, 뒤) 고정 조각으로 분리"""
+    head, _, rest = template.partition("{context}")
+    middle, _, tail = rest.partition("{question}")
+    return head, middle, tail
+
+
+def _render_prompt(parts: Tuple[str, str, str], context: str, question: str) -> str:
+    """미리 분리해 둔 고정 조각 사이에 컨텍스트와 질문만 끼워 넣기"""
+    head, middle, tail = parts
+    return "".join((head, context, middle, question, tail))
+
+
+# 프롬프트 템플릿 (고정 부분은 import 시 한 번만 분리, 호출마다 {context}/{question}만 채움)
+_KNOWLEDGE_PROMPT = """당신은 학습을 돕는 AI 튜터입니다.
+배경지식과 업로드된 문서를 모두 참고하여 학생의 질문에 답변하세요.
+
+<참고 자료>
+{context}
+</참고 자료>
+
+<학생 질문>
+{question}
+</학생 질문>
+
+답변 규칙:
+1. 배경지식과 문서 내용을 종합하여 답변
+2. 자료에 없는 내용은 "해당 내용은 자료에서 찾을 수 없습니다"라고 명시
+3. 배경지식과 문서 내용이 다르면 그 차이점도 설명
+4. 쉽고 명확하게 설명하며 필요시 예시 추가
+
+답변:"""
+_KNOWLEDGE_PROMPT_PARTS = _split_prompt(_KNOWLEDGE_PROMPT)
+
+_KNOWLEDGE_ONLY_PROMPT = """당신은 학습을 돕는 AI 튜터입니다.
+배경지식을 참고하여 학생의 질문에 답변하세요.
+
+<배경지식>
+{context}
+</배경지식>
+
+<학생 질문>
+{question}
+</학생 질문>
+
+답변 규칙:
+1. 배경지식 내용을 기반으로 정확하게 답변
+2. 자료에 없는 내용은 "해당 내용은 자료에서 찾을 수 없습니다"라고 명시
+3. 쉽고 명확하게 설명하며 필요시 예시 추가
+
+답변:"""
+_KNOWLEDGE_ONLY_PROMPT_PARTS = _split_prompt(_KNOWLEDGE_ONLY_PROMPT)
+
+_PDF_ONLY_PROMPT = """당신은 학습을 돕는 AI 튜터입니다.
+업로드된 문서를 참고하여 학생의 질문에 답변하세요.
+
+<업로드된 문서>
+{context}
+</업로드된 문서>
+
+<학생 질문>
+{question}
+</학생 질문>
+
+답변 규칙:
+1. 문서 내용을 기반으로 정확하게 답변
+2. 문서에 없는 내용은 "자료에서 해당 내용을 찾을 수 없습니다"라고 답변
+3. 쉽고 명확하게 설명하며 필요시 예시 추가
+
+답변:"""
+_PDF_ONLY_PROMPT_PARTS = _split_prompt(_PDF_ONLY_PROMPT)
+
+
+class _AnswerCache:
+    """LRU + TTL 답변 캐시 ({키: (만료 시각, 결과)})"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(result)
+
+    def set(self, key: Hashable, result: Dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _results_key(results: List[Tuple[dict, float]]) -> tuple:
+    """검색 결과 식별자 - 인덱스는 PDF마다 0부터 시작하므로 청크 텍스트도 포함"""
+    return tuple((chunk["index"], chunk["text"]) for chunk, _ in results)
+
+
+def _context_blocks(label: str, results: List[Tuple[dict, float]]) -> Iterator[str]:
+    """검색 결과를 "[라벨 n]\n내용" 블록으로 차례대로 생성"""
+    return (f"[{label} {i}]\n{chunk['text']}" for i, (chunk, _) in enumerate(results, 1))
+
+
+def _build_sources(results: List[Tuple[dict, float]], source_type: str) -> List[Dict]:
+    """검색 결과를 화면 표시용 출처 정보로 변환"""
+    return [
+        {
+            "text": chunk["text"][:200] + "...",
+            "score": f"{score:.2f}",
+            "index": chunk["index"],
+            "type": source_type
+        }
+        for chunk, score in results
+    ]
 
 
 class QnASystem:
     """Q&A 전문 모듈 - 배경지식과 사용자 PDF를 종합하여 답변"""
 
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
-
-    def answer_with_knowledge(self, question: str, knowledge_vectorstore, user_pdf_vectorstore, top_k: int = 5) -> Dict:
+    def __init__(
+        self, api_key: str, cache_size: int = 1024, cache_ttl: float = 3600.0,
+        client: Optional[Anthropic] = None
+    ):
+        """
+        Args:
+            api_key: Anthropic API 키
+            cache_size: 답변 캐시 최대 개수
+            cache_ttl: 답변 캐시 유효 시간(초)
+            client: 공유할 Anthropic 클라이언트 (없으면 새로 생성)
+        """
+        # 클라이언트를 공유하면 HTTP 연결 풀(keep-alive)도 함께 재사용
+        self.client = client if client is not None else Anthropic(api_key=api_key)
+        # (질문, 검색된 청크)가 같으면 LLM 호출 없이 이전 답변 재사용
+        self.answer_cache = _AnswerCache(maxsize=cache_size, ttl=cache_ttl)
+
+    @staticmethod
+    def _cache_key(method: str, question: str, top_k: int, *results: List[Tuple[dict, float]]) -> tuple:
+        return (method, question.strip().lower(), top_k) + tuple(_results_key(r) for r in results)
+
+    def answer_with_knowledge(
+        self, question: str, knowledge_vectorstore, user_pdf_vectorstore, top_k: int = 5,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Dict:
         """
         Q&A (배경지식 + 사용자 PDF 모두 활용)
 
@@ -17,15 +175,33 @@ class QnASystem:
             knowledge_vectorstore: 배경지식 벡터스토어 객체
             user_pdf_vectorstore: 사용자 PDF 벡터스토어 객체
             top_k: 각 인덱스에서 검색할 청크 개수
+            query_embedding: 두 벡터스토어와 같은 모델로 미리 계산한 질문 임베딩 (없으면 직접 계산)
 
         Returns:
             {"answer": "답변", "knowledge_sources": [...], "pdf_sources": [...]}
         """
-        # 배경지식에서 검색
-        knowledge_results = knowledge_vectorstore.search(question, top_k=top_k) if knowledge_vectorstore else []
-        
-        # 사용자 PDF에서 검색
-        pdf_results = user_pdf_vectorstore.search(question, top_k=top_k) if user_pdf_vectorstore else []
+        knowledge_ready = knowledge_vectorstore is not None and knowledge_vectorstore.index is not None
+        pdf_ready = user_pdf_vectorstore is not None and user_pdf_vectorstore.index is not None
+
+        if (query_embedding is None and knowledge_ready and pdf_ready
+                and knowledge_vectorstore.model_name == user_pdf_vectorstore.model_name):
+            # 같은 임베딩 모델이면 질문을 한 번만 임베딩하여 두 인덱스에서 검색
+            query_embedding = knowledge_vectorstore.embed_query(question)
+
+        if query_embedding is not None and knowledge_ready and pdf_ready:
+            # 사용자 PDF 검색은 워커 스레드에서, 배경지식 검색은 현재 스레드에서 동시에 실행
+            pdf_future = _search_executor.submit(user_pdf_vectorstore.search_by_vector, query_embedding, top_k)
+            knowledge_results = knowledge_vectorstore.search_by_vector(query_embedding, top_k)
+            pdf_results = pdf_future.result()
+        elif query_embedding is not None:
+            knowledge_results = knowledge_vectorstore.search_by_vector(query_embedding, top_k) if knowledge_ready else []
+            pdf_results = user_pdf_vectorstore.search_by_vector(query_embedding, top_k) if pdf_ready else []
+        else:
+            # 배경지식에서 검색
+            knowledge_results = knowledge_vectorstore.search(question, top_k=top_k) if knowledge_ready else []
+
+            # 사용자 PDF에서 검색
+            pdf_results = user_pdf_vectorstore.search(question, top_k=top_k) if pdf_ready else []
 
         if not knowledge_results and not pdf_results:
             return {
@@ -34,43 +210,21 @@ class QnASystem:
                 "pdf_sources": []
             }
 
-        # 컨텍스트 구성
-        context_parts = []
-        
+        cache_key = self._cache_key("knowledge", question, top_k, knowledge_results, pdf_results)
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 컨텍스트 구성 (블록을 중간 리스트 없이 한 번의 join으로 결합)
+        sections = []
         if knowledge_results:
-            context_parts.append("=== 배경지식 ===")
-            context_parts.extend([
-                f"[배경지식 {i+1}]\n{chunk['text']}"
-                for i, (chunk, score) in enumerate(knowledge_results)
-            ])
-        
+            sections.append(chain(("=== 배경지식 ===",), _context_blocks("배경지식", knowledge_results)))
         if pdf_results:
-            context_parts.append("=== 업로드된 문서 ===")
-            context_parts.extend([
-                f"[문서 {i+1}]\n{chunk['text']}"
-                for i, (chunk, score) in enumerate(pdf_results)
-            ])
+            sections.append(chain(("=== 업로드된 문서 ===",), _context_blocks("문서", pdf_results)))
 
-        context = "\n\n".join(context_parts)
+        context = "\n\n".join(chain.from_iterable(sections))
 
-        prompt = f"""당신은 학습을 돕는 AI 튜터입니다.
-배경지식과 업로드된 문서를 모두 참고하여 학생의 질문에 답변하세요.
-
-<참고 자료>
-{context}
-</참고 자료>
-
-<학생 질문>
-{question}
-</학생 질문>
-
-답변 규칙:
-1. 배경지식과 문서 내용을 종합하여 답변
-2. 자료에 없는 내용은 "해당 내용은 자료에서 찾을 수 없습니다"라고 명시
-3. 배경지식과 문서 내용이 다르면 그 차이점도 설명
-4. 쉽고 명확하게 설명하며 필요시 예시 추가
-
-답변:"""
+        prompt = _render_prompt(_KNOWLEDGE_PROMPT_PARTS, context, question)
 
         response = self.client.messages.create(
             model="claude-haiku-4-5-20251001",
@@ -81,33 +235,21 @@ class QnASystem:
         answer = response.content[0].text
 
         # 출처 정보 분리
-        knowledge_sources = [
-            {
-                "text": chunk["text"][:200] + "...",
-                "score": f"{score:.2f}",
-                "index": chunk["index"],
-                "type": "knowledge"
-            }
-            for chunk, score in knowledge_results
-        ]
-
-        pdf_sources = [
-            {
-                "text": chunk["text"][:200] + "...",
-                "score": f"{score:.2f}",
-                "index": chunk["index"],
-                "type": "user_pdf"
-            }
-            for chunk, score in pdf_results
-        ]
+        knowledge_sources = _build_sources(knowledge_results, "knowledge")
+        pdf_sources = _build_sources(pdf_results, "user_pdf")
 
-        return {
+        result = {
             "answer": answer, 
             "knowledge_sources": knowledge_sources,
             "pdf_sources": pdf_sources
         }
+        self.answer_cache.set(cache_key, result)
+        return dict(result)
 
-    def answer_with_knowledge_only(self, question: str, knowledge_vectorstore, top_k: int = 5) -> Dict:
+    def answer_with_knowledge_only(
+        self, question: str, knowledge_vectorstore, top_k: int = 5,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Dict:
         """
         배경지식만으로 Q&A
 
@@ -115,6 +257,7 @@ class QnASystem:
             question: 사용자 질문
             knowledge_vectorstore: 배경지식 벡터스토어 객체
             top_k: 검색할 청크 개수
+            query_embedding: 벡터스토어와 같은 모델로 미리 계산한 질문 임베딩 (없으면 직접 계산)
 
         Returns:
             {"answer": "답변", "sources": [...]}
@@ -125,7 +268,10 @@ class QnASystem:
                 "sources": []
             }
 
-        results = knowledge_vectorstore.search(question, top_k=top_k)
+        if query_embedding is not None:
+            results = knowledge_vectorstore.search_by_vector(query_embedding, top_k)
+        else:
+            results = knowledge_vectorstore.search(question, top_k=top_k)
 
         if not results:
             return {
@@ -133,30 +279,14 @@ class QnASystem:
                 "sources": []
             }
 
-        context = "\n\n".join(
-            [
-                f"[배경지식 {i+1}]\n{chunk['text']}"
-                for i, (chunk, score) in enumerate(results)
-            ]
-        )
-
-        prompt = f"""당신은 학습을 돕는 AI 튜터입니다.
-배경지식을 참고하여 학생의 질문에 답변하세요.
-
-<배경지식>
-{context}
-</배경지식>
-
-<학생 질문>
-{question}
-</학생 질문>
+        cache_key = self._cache_key("knowledge_only", question, top_k, results)
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-답변 규칙:
-1. 배경지식 내용을 기반으로 정확하게 답변
-2. 자료에 없는 내용은 "해당 내용은 자료에서 찾을 수 없습니다"라고 명시
-3. 쉽고 명확하게 설명하며 필요시 예시 추가
+        context = "\n\n".join(_context_blocks("배경지식", results))
 
-답변:"""
+        prompt = _render_prompt(_KNOWLEDGE_ONLY_PROMPT_PARTS, context, question)
 
         response = self.client.messages.create(
             model="claude-haiku-4-5-20251001",
@@ -166,19 +296,16 @@ class QnASystem:
 
         answer = response.content[0].text
 
-        sources = [
-            {
-                "text": chunk["text"][:200] + "...",
-                "score": f"{score:.2f}",
-                "index": chunk["index"],
-                "type": "knowledge"
-            }
-            for chunk, score in results
-        ]
+        sources = _build_sources(results, "knowledge")
 
-        return {"answer": answer, "sources": sources}
+        result = {"answer": answer, "sources": sources}
+        self.answer_cache.set(cache_key, result)
+        return dict(result)
 
-    def answer_with_pdf_only(self, question: str, user_pdf_vectorstore, top_k: int = 5) -> Dict:
+    def answer_with_pdf_only(
+        self, question: str, user_pdf_vectorstore, top_k: int = 5,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Dict:
         """
         사용자 PDF만으로 Q&A
 
@@ -186,6 +313,7 @@ class QnASystem:
             question: 사용자 질문
             user_pdf_vectorstore: 사용자 PDF 벡터스토어 객체
             top_k: 검색할 청크 개수
+            query_embedding: 벡터스토어와 같은 모델로 미리 계산한 질문 임베딩 (없으면 직접 계산)
 
         Returns:
             {"answer": "답변", "sources": [...]}
@@ -196,7 +324,10 @@ class QnASystem:
                 "sources": []
             }
 
-        results = user_pdf_vectorstore.search(question, top_k=top_k)
+        if query_embedding is not None:
+            results = user_pdf_vectorstore.search_by_vector(query_embedding, top_k)
+        else:
+            results = user_pdf_vectorstore.search(question, top_k=top_k)
 
         if not results:
             return {
@@ -204,30 +335,14 @@ class QnASystem:
                 "sources": []
             }
 
-        context = "\n\n".join(
-            [
-                f"[문서 {i+1}]\n{chunk['text']}"
-                for i, (chunk, score) in enumerate(results)
-            ]
-        )
+        cache_key = self._cache_key("pdf_only", question, top_k, results)
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        prompt = f"""당신은 학습을 돕는 AI 튜터입니다.
-업로드된 문서를 참고하여 학생의 질문에 답변하세요.
+        context = "\n\n".join(_context_blocks("문서", results))
 
-<업로드된 문서>
-{context}
-</업로드된 문서>
-
-<학생 질문>
-{question}
-</학생 질문>
-
-답변 규칙:
-1. 문서 내용을 기반으로 정확하게 답변
-2. 문서에 없는 내용은 "자료에서 해당 내용을 찾을 수 없습니다"라고 답변
-3. 쉽고 명확하게 설명하며 필요시 예시 추가
-
-답변:"""
+        prompt = _render_prompt(_PDF_ONLY_PROMPT_PARTS, context, question)
 
         response = self.client.messages.create(
             model="claude-haiku-4-5-20251001",
@@ -237,14 +352,8 @@ class QnASystem:
 
         answer = response.content[0].text
 
-        sources = [
-            {
-                "text": chunk["text"][:200] + "...",
-                "score": f"{score:.2f}",
-                "index": chunk["index"],
-                "type": "user_pdf"
-            }
-            for chunk, score in results
-        ]
+        sources = _build_sources(results, "user_pdf")
 
-        return {"answer": answer, "sources": sources}
+        result = {"answer": answer, "sources": sources}
+        self.answer_cache.set(cache_key, result)
+        return dict(result)
@@ -1,4 +1,8 @@
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from dotenv import load_dotenv
 
 from anthropic import Anthropic
@@ -6,11 +10,67 @@ from anthropic import Anthropic
 # .env 파일 로드
 load_dotenv()
 from backend.vectorstore import VectorStore
-from backend.pdf_parser import extract_text_from_pdf, chunk_text
+from backend.pdf_parser import iter_pdf_pages, iter_chunks
 from backend.summarize import DocumentSummarizer
 from backend.question_generation import QuestionGenerator
 from backend.qna import QnASystem
-from typing import List, Tuple
+from backend.semantic_cache import SemanticCache
+from typing import Iterable, Iterator, List, Tuple
+
+# 사용자 PDF 인덱싱 시 한 번에 임베딩할 청크 수
+PDF_ENCODE_BATCH = 64
+
+# 추출/청킹 스레드가 임베딩보다 앞서 준비해 둘 최대 배치 수
+PDF_PREFETCH_BATCHES = 4
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    """items를 size개씩 묶어 반환 (마지막 묶음은 더 작을 수 있음)"""
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def _prefetch(items: Iterable, maxsize: int) -> Iterator:
+    """
+    items를 백그라운드 스레드에서 미리 만들어 두며 순서대로 반환
+
+    생산 쪽 예외는 소비 쪽에서 다시 발생하고, 소비를 중단하면 생산 스레드도 멈춥니다.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((True, item)):
+                    return
+        except Exception as e:
+            put((False, e))
+        else:
+            put((False, None))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(produce)
+        try:
+            while True:
+                has_item, value = buffer.get()
+                if not has_item:
+                    if value is not None:
+                        raise value
+                    return
+                yield value
+        finally:
+            stop.set()
 
 
 class RAGSystem:
@@ -27,8 +87,13 @@ class RAGSystem:
         # 배경지식용 벡터스토어 (영구 저장)
         self.knowledge_vectorstore = VectorStore(model_name, cache_folder=cache_dir)
         
-        # 사용자 PDF용 벡터스토어 (임시 저장)
-        self.user_pdf_vectorstore = VectorStore(model_name, cache_folder=cache_dir)
+        # 사용자 PDF용 벡터스토어 (임시 저장) - 임베딩 모델은 배경지식과 공유하여 한 번만 로드
+        self.user_pdf_vectorstore = VectorStore(model_name, model=self.knowledge_vectorstore.model)
+
+        # 동시 검색 배칭 (env SEARCH_BATCH_WINDOW_MS > 0일 때, 모든 세션이 공유하는 배경지식 인덱스에만 적용)
+        batch_window_ms = float(os.environ.get("SEARCH_BATCH_WINDOW_MS", "0"))
+        if batch_window_ms > 0:
+            self.knowledge_vectorstore.enable_search_batching(batch_window_ms / 1000)
 
         # 사전 생성된 배경지식 인덱스 자동 로드 (옵션)
         knowledge_index_path = (
@@ -46,23 +111,34 @@ class RAGSystem:
         self.api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise RuntimeError("ANTHROPIC_API_KEY 환경변수가 설정되지 않았습니다.")
-        self.client = None
+        # 프로세스 전체에서 하나의 클라이언트(HTTP 연결 풀)를 사용
+        self.client = Anthropic(api_key=self.api_key)
         self.document_name = None
         
         # 전문 모듈들 초기화
         self.summarizer = DocumentSummarizer(self.api_key)
         self.question_generator = QuestionGenerator(self.api_key)
-        self.qna_system = QnASystem(self.api_key)
+        self.qna_system = QnASystem(self.api_key, client=self.client)
+
+        # 유사 질문 결과 재사용 (두 벡터스토어는 같은 임베딩 모델 객체를 사용)
+        self.semantic_cache = SemanticCache(self.user_pdf_vectorstore.dimension)
 
     # 배경지식 인덱스 생성 기능은 모듈(backend/knowledge_indexer.py)로 분리되었습니다.
 
-    def index_user_pdf(self, pdf_path: str, chunk_size: int = 500):
+    def _new_user_pdf_store(self) -> VectorStore:
+        # 배경지식 벡터스토어와 같은 임베딩 모델 객체를 공유하는 빈 사용자 PDF 벡터스토어
+        return VectorStore(self.user_pdf_vectorstore.model_name, model=self.knowledge_vectorstore.model)
+
+    def build_user_pdf_store(self, pdf_path: str, chunk_size: int = 500) -> VectorStore:
         """
-        사용자 PDF 인덱싱 (임시 저장)
+        사용자 PDF로 새 벡터스토어 생성 (현재 사용 중인 인덱스/문서는 바꾸지 않음)
 
         Args:
             pdf_path: PDF 파일 경로
             chunk_size: 청크 크기
+
+        Returns:
+            인덱싱된 VectorStore (use_user_pdf_store로 교체)
         """
         # 파일 존재 여부 확인
         if not os.path.exists(pdf_path):
@@ -74,21 +150,62 @@ class RAGSystem:
 
         print(f"📄 사용자 PDF 처리 중: {pdf_path}")
 
-        # 1. 텍스트 추출
-        text = extract_text_from_pdf(pdf_path)
-        print(f"✅ 텍스트 추출 완료: {len(text)} 글자")
+        # 텍스트 추출/청킹(백그라운드 스레드)과 임베딩/인덱싱(현재 스레드)을 겹쳐서 실행
+        # 새 벡터스토어에 만들어 두고 모두 성공한 뒤에 교체 (실패 시 기존 인덱스/문서 유지,
+        # 다른 세션의 검색이 추가 중인 인덱스를 보지 않음)
+        store = self._new_user_pdf_store()
+        store.reset()
+        chunks = iter_chunks(iter_pdf_pages(pdf_path), chunk_size=chunk_size)
+        for batch in _prefetch(_batched(chunks, PDF_ENCODE_BATCH), PDF_PREFETCH_BATCHES):
+            store.add_chunks(batch)
+        print(f"✅ 인덱스 생성 완료: {len(store.chunks)}개 청크")
+        return store
+
+    def use_user_pdf_store(self, store: VectorStore, document_name: str) -> int:
+        """
+        사용자 PDF 벡터스토어 교체
 
-        # 2. 청킹
-        chunks = chunk_text(text, chunk_size=chunk_size)
-        print(f"✅ 청킹 완료: {len(chunks)}개 청크")
+        Args:
+            store: build_user_pdf_store 등으로 만든 VectorStore
+            document_name: 문서 이름
 
-        # 3. 사용자 PDF 인덱싱
-        self.user_pdf_vectorstore.create_index(chunks)
+        Returns:
+            인덱스의 청크 수
+        """
+        self.user_pdf_vectorstore = store
+        self.document_name = document_name
 
-        # 문서 이름 저장
-        self.document_name = os.path.basename(pdf_path)
+        # 같은 이름의 다른 문서일 수 있으므로 이전 문서 기준 답변은 모두 폐기
+        self.semantic_cache.clear()
 
-        return len(chunks)
+        return len(store.chunks)
+
+    def index_user_pdf(self, pdf_path: str, chunk_size: int = 500):
+        """
+        사용자 PDF 인덱싱 (임시 저장)
+
+        Args:
+            pdf_path: PDF 파일 경로
+            chunk_size: 청크 크기
+        """
+        store = self.build_user_pdf_store(pdf_path, chunk_size=chunk_size)
+        return self.use_user_pdf_store(store, os.path.basename(pdf_path))
+
+    def restore_user_pdf_index(self, index_bytes: bytes, chunks: List[dict], document_name: str) -> int:
+        """
+        캐시해 둔 사용자 PDF 인덱스로 교체 (추출/임베딩 생략)
+
+        Args:
+            index_bytes: VectorStore.serialize()로 만든 FAISS 인덱스 바이트
+            chunks: 청크 리스트
+            document_name: 문서 이름
+
+        Returns:
+            인덱스의 청크 수
+        """
+        store = self._new_user_pdf_store()
+        store.deserialize(index_bytes, chunks)
+        return self.use_user_pdf_store(store, document_name)
 
     def upload_and_index_pdf(self, uploaded_file_content: bytes, filename: str, upload_dir: str = "./data/uploads", chunk_size: int = 500):
         """
@@ -154,12 +271,21 @@ class RAGSystem:
         Returns:
             {"answer": "답변", "knowledge_sources": [...], "pdf_sources": [...]}
         """
-        return self.qna_system.answer_with_knowledge(
+        namespace = ("knowledge", self.document_name, top_k)
+        query_embedding = self.user_pdf_vectorstore.embed_query(question)
+        cached = self.semantic_cache.get(namespace, query_embedding)
+        if cached is not None:
+            return cached
+
+        result = self.qna_system.answer_with_knowledge(
             question, 
             self.knowledge_vectorstore, 
             self.user_pdf_vectorstore, 
-            top_k
+            top_k,
+            query_embedding=query_embedding
         )
+        self.semantic_cache.set(namespace, query_embedding, result)
+        return result
 
     def generate_questions_by_topic(self, topic: str, num_questions: int = 3) -> dict:
         """
@@ -189,11 +315,20 @@ class RAGSystem:
         Returns:
             {"answer": "답변", "sources": [...]} 
         """
-        return self.qna_system.answer_with_knowledge_only(
+        namespace = ("knowledge_only", top_k)
+        query_embedding = self.knowledge_vectorstore.embed_query(question)
+        cached = self.semantic_cache.get(namespace, query_embedding)
+        if cached is not None:
+            return cached
+
+        result = self.qna_system.answer_with_knowledge_only(
             question, 
             self.knowledge_vectorstore, 
-            top_k
+            top_k,
+            query_embedding=query_embedding
         )
+        self.semantic_cache.set(namespace, query_embedding, result)
+        return result
 
     def qna_with_pdf_only(self, question: str, top_k: int = 3) -> dict:
         """
@@ -206,11 +341,20 @@ class RAGSystem:
         Returns:
             {"answer": "답변", "sources": [...]} 
         """
-        return self.qna_system.answer_with_pdf_only(
+        namespace = ("pdf_only", self.document_name, top_k)
+        query_embedding = self.user_pdf_vectorstore.embed_query(question)
+        cached = self.semantic_cache.get(namespace, query_embedding)
+        if cached is not None:
+            return cached
+
+        result = self.qna_system.answer_with_pdf_only(
             question, 
             self.user_pdf_vectorstore, 
-            top_k
+            top_k,
+            query_embedding=query_embedding
         )
+        self.semantic_cache.set(namespace, query_embedding, result)
+        return result
 
     def save_knowledge_index(self, path: str = "./data/knowledge_vectorstore"):
         """배경지식 인덱스 저장"""
@@ -219,6 +363,7 @@ class RAGSystem:
     def load_knowledge_index(self, path: str = "./data/knowledge_vectorstore"):
         """배경지식 인덱스 로드"""
         self.knowledge_vectorstore.load(path)
+        self.semantic_cache.clear()
 
     def save_user_pdf_index(self, path: str = "./data/user_pdf_vectorstore"):
         """사용자 PDF 인덱스 저장"""
@@ -227,6 +372,7 @@ class RAGSystem:
     def load_user_pdf_index(self, path: str = "./data/user_pdf_vectorstore"):
         """사용자 PDF 인덱스 로드"""
         self.user_pdf_vectorstore.load(path)
+        self.semantic_cache.clear()
 
     # 하위 호환성을 위한 기존 메서드들 (deprecated)
     # 레거시 통합 인덱스 관련 메서드는 제거되었습니다.
@@ -0,0 +1,84 @@
+import threading
+import time
+import numpy as np
+import faiss
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class SemanticCache:
+    """
+    질문 임베딩 기반 시맨틱 캐시
+
+    이전 질문과 코사인 유사도가 threshold 이상이면 저장된 결과를 그대로 반환하여
+    검색과 LLM 호출을 모두 건너뜁니다. 네임스페이스(질문 방식, 문서 등)마다
+    과거 질문 임베딩을 담은 IndexFlatIP를 따로 유지합니다.
+    """
+
+    def __init__(self, dimension: int, threshold: float = 0.92, max_entries: int = 256, ttl: float = 3600.0):
+        """
+        Args:
+            dimension: 질문 임베딩 차원 (L2 정규화된 벡터를 가정)
+            threshold: 캐시 적중으로 볼 최소 코사인 유사도
+            max_entries: 네임스페이스별 최대 저장 개수 (초과 시 가장 오래된 항목부터 제거)
+            ttl: 결과 유효 시간(초)
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # {네임스페이스: (질문 임베딩 인덱스, [(만료 시각, 결과), ...])} - 리스트 순서 = 인덱스 id
+        self._namespaces: Dict[Hashable, Tuple[faiss.IndexFlatIP, List[Tuple[float, Dict]]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: Hashable, query_embedding: np.ndarray) -> Optional[Dict]:
+        """
+        가장 유사한 이전 질문의 결과 조회
+
+        Args:
+            namespace: 캐시 네임스페이스
+            query_embedding: (1, dimension) L2 정규화된 float32 배열
+
+        Returns:
+            저장된 결과 (없거나 만료되었으면 None)
+        """
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if entry is None or entry[0].ntotal == 0:
+                return None
+
+            index, results = entry
+            scores, ids = index.search(query_embedding, 1)
+            if scores[0][0] < self.threshold:
+                return None
+
+            row = int(ids[0][0])
+            expires_at, result = results[row]
+            if expires_at < time.monotonic():
+                self._remove(index, results, row)
+                return None
+            return dict(result)
+
+    def set(self, namespace: Hashable, query_embedding: np.ndarray, result: Dict):
+        """질문 임베딩과 결과 저장"""
+        with self._lock:
+            entry = self._namespaces.get(namespace)
+            if entry is None:
+                entry = self._namespaces[namespace] = (faiss.IndexFlatIP(self.dimension), [])
+
+            index, results = entry
+            if index.ntotal >= self.max_entries:
+                self._remove(index, results, 0)
+
+            index.add(query_embedding)
+            results.append((time.monotonic() + self.ttl, result))
+
+    def clear(self):
+        """모든 네임스페이스 삭제 (사용자 문서가 바뀌었을 때 호출)"""
+        with self._lock:
+            self._namespaces.clear()
+
+    @staticmethod
+    def _remove(index: faiss.IndexFlatIP, results: List[Tuple[float, Dict]], row: int):
+        # IndexFlat은 삭제 후 뒤쪽 id를 앞으로 당기므로 리스트에서도 같은 위치를 제거
+        index.remove_ids(np.array([row], dtype=np.int64))
+        results.pop(row)
@@ -1,27 +1,208 @@
+import os
+import math
 import numpy as np
 import faiss
+import torch
 import pickle
+import operator
+from collections.abc import Sequence
 from pathlib import Path
 from sentence_transformers import SentenceTransformer
-from typing import List, Tuple
+from backend.onnx_encoder import OnnxEncoder
+from backend.batch_search import BatchingSearchClient
+from typing import List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow는 선택 의존성 (없으면 청크 메타데이터를 pickle로 저장)
+    pa = None
+
+
+# 청크 수에 따른 인덱스 종류 선택 기준
+FLAT_MAX_VECTORS = 5_000  # 이보다 적으면 전수 검색(Flat)
+HNSW_MAX_VECTORS = 100_000  # 이보다 적으면 HNSW, 이상이면 IVF+PQ
+
+# 인덱스별 구성/검색 파라미터
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+
+# 인덱스 디렉토리 안의 파일 이름
+INDEX_FILE = "index.faiss"
+CHUNKS_ARROW_FILE = "chunks.arrow"  # 열 단위 Arrow IPC (pyarrow 설치 시)
+CHUNKS_PICKLE_FILE = "chunks.pkl"  # dict 리스트 pickle (pyarrow 미설치 시 / 이전 버전 인덱스)
+
+# 인덱스 파일을 메모리 맵으로 여는 플래그 - 앞에서부터 시도
+# (MMAP_IFC: Flat/SQ 계열 코드까지 매핑하지만 IVF 인덱스는 거부함 -> MMAP만으로 IVF 역리스트 매핑)
+MMAP_READ_FLAGS = tuple(
+    flags | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    for flags in (getattr(faiss, "IO_FLAG_MMAP_IFC", None), 0)
+    if flags is not None
+)
+
+# 인덱싱 시 임베딩 배치 크기 (길이순 정렬된 배치라 크게 잡아도 패딩 낭비가 적음)
+EMBED_BATCH_SIZE = 128
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """벡터를 약 4차원씩 나누는 PQ 서브 양자화기 수 (차원을 나누어 떨어지게 선택)"""
+    m = max(1, dimension // 4)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def _amx_supported() -> bool:
+    """CPU가 AMX(BF16 행렬 연산 타일)를 지원하는지 확인 (확인 함수가 없는 PyTorch 버전이면 False)"""
+    is_amx_supported = getattr(torch.cpu, "_is_amx_tile_supported", None)
+    return bool(is_amx_supported and is_amx_supported())
+
+
+def _drop_nulls(value):
+    """Arrow가 채운 None 값을 중첩된 dict까지 제거 (행/구조체마다 없던 키를 원래대로 복원)"""
+    if isinstance(value, dict):
+        return {key: _drop_nulls(v) for key, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_drop_nulls(v) for v in value]
+    return value
+
+
+# Arrow 열로 저장했다 읽어도 값과 타입이 그대로인 파이썬 스칼라 타입
+_ARROW_SCALAR_TYPES = (str, int, float, bool)
+
+
+def _roundtrips_through_arrow(values: list) -> bool:
+    """
+    한 열의 값들을 Arrow로 저장했다 읽어도 같은 값이 나오는지 스키마 수준에서 확인
+
+    값 자체가 None이거나(읽을 때 없는 키와 구분되지 않음) 타입이 섞여 있으면 False를 반환하며,
+    dict/list 값은 하위 필드/원소별로 같은 규칙을 적용합니다. (행 dict를 다시 만들지 않음)
+    """
+    stack = [values]
+    while stack:
+        values = stack.pop()
+        types = {type(value) for value in values}
+        if len(types) > 1:
+            return False
+        if not types:
+            continue  # 모든 행에 없는 필드 (전부 null)
+
+        kind = types.pop()
+        if kind is dict:
+            keys = dict.fromkeys(key for value in values for key in value)
+            if not all(isinstance(key, str) for key in keys):
+                return False
+            stack.extend([value[key] for value in values if key in value] for key in keys)
+        elif kind is list:
+            stack.append([item for value in values for item in value])
+        elif kind not in _ARROW_SCALAR_TYPES:
+            return False
+    return True
+
+
+def _chunks_to_table(chunks: List[dict]) -> Optional["pa.Table"]:
+    """
+    청크 리스트를 열 단위 Arrow 테이블로 변환
+
+    모든 청크의 키를 합친 열을 만들고(없는 값은 null), 다시 읽었을 때 원래 청크와 같지 않을 열이 있으면
+    (값 자체가 None인 키, 열마다 섞인 타입 등) None을 반환하여 pickle로 저장하게 합니다.
+    """
+    if not all(type(chunk) is dict for chunk in chunks):
+        return None
+    keys = list(dict.fromkeys(key for chunk in chunks for key in chunk))
+    if not keys:
+        return None  # 열이 없는 테이블은 행 수를 보존하지 못함
+    if not all(
+        isinstance(key, str) and _roundtrips_through_arrow([chunk[key] for chunk in chunks if key in chunk])
+        for key in keys
+    ):
+        return None
+    try:
+        return pa.table({key: [chunk.get(key) for chunk in chunks] for key in keys})
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+
+
+class ArrowChunks(Sequence):
+    """
+    Arrow 테이블을 청크 dict 리스트처럼 다루는 읽기 전용 뷰
+
+    메모리 맵에서 읽은 열 데이터를 그대로 두고, 인덱싱한 행만 dict로 만듭니다.
+    (null 값은 중첩된 dict까지 제외하여 원래 청크와 같은 키만 가짐)
+    """
+
+    def __init__(self, table: "pa.Table"):
+        self.table = table
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+
+        return _drop_nulls(self.table.slice(i, 1).to_pylist()[0])
 
 
 class VectorStore:
     """FAISS 기반 벡터 저장소"""
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache_folder: str = None):
-        print(f"임베딩 모델 로딩 중: {model_name}")
+    def __init__(
+        self, model_name: str = "all-MiniLM-L6-v2", cache_folder: str = None, onnx_model_dir: str = None,
+        model=None
+    ):
+        """
+        Args:
+            model_name: SentenceTransformer 모델명
+            cache_folder: 모델 캐시 폴더
+            onnx_model_dir: 같은 모델을 ONNX로 변환한 디렉토리 (env EMBEDDING_ONNX_DIR, 지정 시 ONNX Runtime으로 임베딩)
+            model: 이미 로드한 임베딩 모델 (다른 VectorStore와 공유할 때 지정, model_name 모델이어야 함)
+        """
+        self.model_name = model_name
+        if model is not None:
+            self.model = model
+        else:
+            print(f"임베딩 모델 로딩 중: {model_name}")
 
-        # 캐시 폴더 지정 (프로젝트 내부에 저장 가능)
-        if cache_folder is None:
-            cache_folder = "./models"  # 프로젝트 폴더 안에 저장
+            # 캐시 폴더 지정 (프로젝트 내부에 저장 가능)
+            if cache_folder is None:
+                cache_folder = "./models"  # 프로젝트 폴더 안에 저장
 
-        Path(cache_folder).mkdir(parents=True, exist_ok=True)
+            Path(cache_folder).mkdir(parents=True, exist_ok=True)
 
-        self.model = SentenceTransformer(model_name, cache_folder=cache_folder)
+            if onnx_model_dir is None:
+                onnx_model_dir = os.environ.get("EMBEDDING_ONNX_DIR")
+
+            if onnx_model_dir:
+                # INT8 양자화 ONNX 모델은 CPU에서 PyTorch 대비 수 배 빠름 (코사인 오차 1% 이내)
+                self.model = OnnxEncoder(onnx_model_dir)
+            else:
+                self.model = SentenceTransformer(model_name, cache_folder=cache_folder)
+                if _amx_supported():
+                    # AMX 탑재 CPU에서는 BF16 가중치로 행렬 연산 처리량을 높임 (출력은 _encode에서 float32로 변환)
+                    self.model = self.model.to(torch.bfloat16)
         self.dimension = self.model.get_sentence_embedding_dimension()
         self.index = None
+        self.index_mmapped = False  # 읽기 전용 메모리 맵 인덱스 여부 (load(mmap=True))
+        self.index_path = None  # 메모리 맵으로 연 인덱스 파일 경로 (쓰기 전에 메모리로 다시 읽을 때 사용)
         self.chunks = []
+        self.search_client = None  # enable_search_batching()으로 설정
+
+    def enable_search_batching(self, window: float = 0.005):
+        """
+        여러 스레드(세션)에서 동시에 들어온 검색을 window초 동안 모아 한 번의 index.search로 처리
+
+        Args:
+            window: 요청을 모으는 시간(초) - 단독 요청도 이만큼 지연됨
+        """
+        self.search_client = BatchingSearchClient(lambda queries, k: self.index.search(queries, k), window)
 
     def create_index(self, chunks: List[dict]):
         """
@@ -36,18 +217,115 @@ class VectorStore:
         texts = [chunk["text"] for chunk in chunks]
 
         # 임베딩 생성
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        embeddings = np.array(embeddings).astype("float32")
+        embeddings = self._encode(texts, batch_size=EMBED_BATCH_SIZE, show_progress_bar=True)
 
         # FAISS 인덱스 생성
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.index.add(embeddings)
+        self.index = self._build_index(embeddings)
+        self.index_mmapped = False
 
         # 청크 메타데이터 저장
         self.chunks = chunks
 
         print(f"✅ 인덱스 생성 완료: {len(chunks)}개 청크")
 
+    def reset(self):
+        """빈 전수 검색(Flat) 인덱스로 초기화 (이후 add_chunks로 청크를 나누어 추가)"""
+        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index_mmapped = False
+        self.chunks = []
+
+    def add_chunks(self, chunks: List[dict]):
+        """
+        청크를 임베딩하여 기존 인덱스에 추가
+
+        Args:
+            chunks: [{"text": "...", "index": 0}, ...]
+        """
+        if self.index is None:
+            self.reset()
+        else:
+            # 읽기 전용 메모리 맵에는 추가할 수 없으므로 메모리로 읽음
+            self._load_index_into_memory()
+            if isinstance(self.chunks, ArrowChunks):
+                self.chunks = list(self.chunks)
+
+        embeddings = self._encode([chunk["text"] for chunk in chunks], batch_size=EMBED_BATCH_SIZE)
+        self.index.add(embeddings)
+        self.chunks.extend(chunks)
+
+    def _load_index_into_memory(self):
+        """
+        메모리 맵으로 연 인덱스를 원래 파일에서 메모리로 다시 읽음
+
+        IVF 인덱스의 메모리 맵 역리스트(OnDiskInvertedLists)는 파일 경로만 가리키므로
+        그대로 직렬화/저장하면 역리스트 데이터가 빠진 인덱스가 만들어짐 (추가/저장/직렬화 전에 호출)
+        """
+        if not self.index_mmapped:
+            return
+        self.index = faiss.read_index(self.index_path)
+        self._configure_search(self.index)
+        self.index_mmapped = False
+        self.index_path = None
+
+    def _encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        """
+        텍스트 임베딩 후 L2 정규화 (float32, (N, dimension))
+
+        단위 벡터 사이의 제곱 L2 거리는 2 - 2·cos 이므로 L2 인덱스의 검색 순위가
+        코사인 유사도 순위와 같아지고, score는 계속 "낮을수록 유사"를 유지합니다.
+        """
+        # encode가 이미 정규화된 C 연속 float32 배열을 반환하므로 추가 복사 없음
+        embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True, **kwargs)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def _build_index(self, embeddings: np.ndarray):
+        """
+        벡터 수에 맞는 FAISS 인덱스를 만들고 임베딩을 추가
+
+        - FLAT_MAX_VECTORS 미만: IndexFlatL2 (정확한 전수 검색)
+        - HNSW_MAX_VECTORS 미만: HNSW 그래프 + INT8 스칼라 양자화 (로그 수준 검색, 벡터당 d 바이트)
+        - 그 이상: IVF + PQ (벡터당 d/4 바이트, 메모리 사용량 최소)
+        """
+        num_vectors = len(embeddings)
+
+        if num_vectors < FLAT_MAX_VECTORS:
+            index = faiss.IndexFlatL2(self.dimension)
+        elif num_vectors < HNSW_MAX_VECTORS:
+            # 벡터를 FP32 대신 차원별 INT8 코드로 저장 (메모리 1/4, 쿼리는 float 그대로 사용)
+            index = faiss.index_factory(self.dimension, f"HNSW{HNSW_M},SQ8", faiss.METRIC_L2)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        else:
+            nlist = int(4 * math.sqrt(num_vectors))
+            m = _pq_subquantizers(self.dimension)
+            index = faiss.index_factory(self.dimension, f"IVF{nlist},PQ{m}x8", faiss.METRIC_L2)
+
+        # SQ8의 값 범위 / IVF 중심점·PQ 코드북 학습
+        if not index.is_trained:
+            index.train(embeddings)
+        index.add(embeddings)
+        self._configure_search(index)
+        return index
+
+    @staticmethod
+    def _configure_search(index):
+        """검색 파라미터 설정 (IVF의 nprobe는 파일에 저장되지 않으므로 로드 후에도 호출)"""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = IVF_NPROBE
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        쿼리 임베딩 생성
+
+        Args:
+            query: 검색 쿼리
+
+        Returns:
+            (1, dimension) L2 정규화된 float32 배열
+        """
+        return self._encode([query])
+
     def search(self, query: str, top_k: int = 3) -> List[Tuple[dict, float]]:
         """
         쿼리와 유사한 청크 검색
@@ -56,45 +334,126 @@ class VectorStore:
             query: 검색 쿼리
             top_k: 반환할 결과 개수
 
+        Returns:
+            [(chunk, score), ...] - score(정규화 벡터 간 제곱 L2 거리, 0~4)가 낮을수록 유사
+        """
+        if self.index is None:
+            return []
+
+        return self.search_by_vector(self.embed_query(query), top_k)
+
+    def search_by_vector(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Tuple[dict, float]]:
+        """
+        미리 계산한 쿼리 임베딩으로 유사한 청크 검색
+
+        Args:
+            query_embedding: embed_query()로 만든 (1, dimension) 배열
+            top_k: 반환할 결과 개수
+
         Returns:
             [(chunk, score), ...] - score가 낮을수록 유사
         """
         if self.index is None:
             return []
 
-        # 쿼리 임베딩
-        query_embedding = self.model.encode([query])
-        query_embedding = np.array(query_embedding).astype("float32")
+        # 검색 (배칭 사용 시 동시에 들어온 다른 쿼리와 함께 검색)
+        if self.search_client is not None:
+            distances, indices = self.search_client.search(query_embedding, top_k)
+        else:
+            distances, indices = self.index.search(query_embedding, top_k)
+
+        # 유효한 id만 한 번에 골라낸 뒤 해당 청크만 조회
+        # (결과가 top_k보다 적으면 FAISS가 -1로 채우므로 음수 id도 제외)
+        ids, dists = indices[0], distances[0]
+        mask = (ids >= 0) & (ids < len(self.chunks))
+        return [(self.chunks[i], d) for i, d in zip(ids[mask].tolist(), dists[mask].tolist())]
 
-        # 검색
-        distances, indices = self.index.search(query_embedding, top_k)
+    def serialize(self) -> Tuple[bytes, List[dict]]:
+        """인덱스를 (FAISS 인덱스 바이트, 청크 리스트)로 변환 (파일 없이 캐시/복원할 때 사용)"""
+        self._load_index_into_memory()
+        return faiss.serialize_index(self.index).tobytes(), list(self.chunks)
 
-        # 결과 반환
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx < len(self.chunks):
-                results.append((self.chunks[idx], float(dist)))
+    def deserialize(self, index_bytes: bytes, chunks: List[dict]):
+        """serialize() 결과로 인덱스 복원"""
+        self.index = faiss.deserialize_index(np.frombuffer(index_bytes, dtype=np.uint8))
+        self.index_mmapped = False
+        self._configure_search(self.index)
+        # 캐시 등에서 받은 리스트를 그대로 쓰면 이후 add_chunks가 원본까지 변경하므로 복사
+        self.chunks = list(chunks)
 
-        return results
+    @staticmethod
+    def exists(path: str) -> bool:
+        """저장된 인덱스(FAISS 인덱스 + 청크 메타데이터)가 있는지 확인"""
+        path = Path(path)
+        return (path / INDEX_FILE).exists() and (
+            (path / CHUNKS_ARROW_FILE).exists() or (path / CHUNKS_PICKLE_FILE).exists()
+        )
 
     def save(self, path: str):
         """인덱스 저장"""
         Path(path).mkdir(parents=True, exist_ok=True)
 
-        # FAISS 인덱스 저장
-        faiss.write_index(self.index, f"{path}/index.faiss")
+        # 다른 프로세스/인덱스가 기존 파일을 메모리 맵으로 열고 있을 수 있으므로
+        # 임시 파일에 쓴 뒤 교체 (기존 파일을 덮어쓰면 매핑된 페이지가 잘려 SIGBUS 발생)
+        self._load_index_into_memory()
+        index_tmp = f"{path}/{INDEX_FILE}.tmp"
+        faiss.write_index(self.index, index_tmp)
+        os.replace(index_tmp, f"{path}/{INDEX_FILE}")
 
-        # 메타데이터 저장
-        with open(f"{path}/chunks.pkl", "wb") as f:
-            pickle.dump(self.chunks, f)
+        # 메타데이터 저장 (형식이 바뀌어도 이전 파일이 남지 않도록 다른 형식 파일은 삭제)
+        if isinstance(self.chunks, ArrowChunks):
+            table = self.chunks.table
+        elif pa is not None:
+            table = _chunks_to_table(list(self.chunks))
+        else:
+            table = None
+
+        if table is not None:
+            chunks_tmp = f"{path}/{CHUNKS_ARROW_FILE}.tmp"
+            with pa.OSFile(chunks_tmp, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(chunks_tmp, f"{path}/{CHUNKS_ARROW_FILE}")
+            Path(path, CHUNKS_PICKLE_FILE).unlink(missing_ok=True)
+        else:
+            with open(f"{path}/{CHUNKS_PICKLE_FILE}", "wb") as f:
+                pickle.dump(list(self.chunks), f)
+            Path(path, CHUNKS_ARROW_FILE).unlink(missing_ok=True)
 
         print(f"✅ 인덱스 저장 완료: {path}")
 
-    def load(self, path: str):
-        """인덱스 로드"""
-        self.index = faiss.read_index(f"{path}/index.faiss")
+    def load(self, path: str, mmap: bool = True):
+        """
+        인덱스 로드
+
+        Args:
+            path: 인덱스 디렉토리
+            mmap: 인덱스 파일을 읽기 전용 메모리 맵으로 열기 (필요한 페이지만 읽고, 같은 파일을 여는
+                  프로세스끼리 페이지 캐시를 공유). 지원하지 않는 경우 전체를 메모리로 읽음
+        """
+        index_path = f"{path}/{INDEX_FILE}"
+        self.index_mmapped = False
+        if mmap:
+            for flags in MMAP_READ_FLAGS:
+                try:
+                    self.index = faiss.read_index(index_path, flags)
+                    self.index_mmapped = True
+                    self.index_path = index_path
+                    break
+                except RuntimeError as e:
+                    error = e
+            else:
+                print(f"⚠️ 인덱스 메모리 맵 실패, 전체를 메모리로 읽습니다: {error}")
+        if not self.index_mmapped:
+            self.index = faiss.read_index(index_path)
+        self._configure_search(self.index)
 
-        with open(f"{path}/chunks.pkl", "rb") as f:
-            self.chunks = pickle.load(f)
+        arrow_path = f"{path}/{CHUNKS_ARROW_FILE}"
+        if pa is not None and Path(arrow_path).exists():
+            # 메모리 맵으로 열어 청크별 파이썬 객체를 만들지 않음 (검색된 청크만 변환)
+            self.chunks = ArrowChunks(pa.ipc.open_file(pa.memory_map(arrow_path)).read_all())
+        else:
+            with open(f"{path}/{CHUNKS_PICKLE_FILE}", "rb") as f:
+                self.chunks = pickle.load(f)
 
         print(f"✅ 인덱스 로드 완료: {len(self.chunks)}개 청크")
@@ -1,6 +1,9 @@
 import os
 import sys
 import time
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
@@ -33,13 +36,14 @@ def check_environment():
     return True
 
 from backend.rag import RAGSystem
+from backend.vectorstore import VectorStore
 
 
 @st.cache_resource
-def get_rag_system(cache_dir: str):
-    # 최초 1회만 실제 모델 로드됨 (이후 캐시)
+def get_rag_system(cache_dir: str, knowledge_path: str):
+    # 프로세스당 최초 1회만 모델과 배경지식 인덱스 로드 (이후 모든 세션이 공유)
     try:
-        return RAGSystem(model_name="all-MiniLM-L6-v2", cache_dir=cache_dir)
+        rag_system = RAGSystem(model_name="all-MiniLM-L6-v2", cache_dir=cache_dir, knowledge_index_path=knowledge_path)
     except RuntimeError as e:
         if "ANTHROPIC_API_KEY" in str(e):
             st.error("⚠️ ANTHROPIC_API_KEY 환경변수가 설정되지 않았습니다.")
@@ -47,6 +51,118 @@ def get_rag_system(cache_dir: str):
             return None
         else:
             raise e
+    # 배경지식 없는 시스템이 캐시되면 서버 재시작 전까지 재시도할 수 없으므로 예외로 캐시를 건너뜀
+    if rag_system.knowledge_vectorstore.index is None:
+        raise RuntimeError("배경지식 로드 실패: 서버 로그를 확인해주세요.")
+    return rag_system
+
+
+# 인덱싱 결과를 보관할 PDF 수 (오래 쓰지 않은 것부터 제거)
+USER_PDF_INDEX_CACHE_SIZE = 16
+
+
+@st.cache_resource
+def _user_pdf_index_cache():
+    # 모든 세션이 공유하는 {PDF SHA-256: (FAISS 인덱스 바이트, 청크)} LRU와 잠금
+    return OrderedDict(), threading.Lock()
+
+
+def index_uploaded_pdf(rag_system, file_path: str, pdf_sha: str, force: bool = False) -> int:
+    """
+    업로드된 PDF 인덱싱 (같은 내용을 인덱싱한 적이 있으면 추출/청킹/임베딩 없이 캐시에서 복원)
+
+    Args:
+        rag_system: RAGSystem
+        file_path: 저장된 PDF 경로
+        pdf_sha: PDF 내용의 SHA-256
+        force: True면 캐시를 무시하고 다시 인덱싱
+
+    Returns:
+        인덱스의 청크 수
+    """
+    cache, lock = _user_pdf_index_cache()
+    document_name = os.path.basename(file_path)
+
+    if not force:
+        with lock:
+            cached = cache.get(pdf_sha)
+            if cached is not None:
+                cache.move_to_end(pdf_sha)
+        if cached is not None:
+            index_bytes, chunks = cached
+            return rag_system.restore_user_pdf_index(index_bytes, chunks, document_name)
+
+    # 새로 만든 벡터스토어를 그대로 사용하고, 캐시에는 직렬화한 결과만 보관
+    store = rag_system.build_user_pdf_store(file_path)
+    num_chunks = rag_system.use_user_pdf_store(store, document_name)
+    entry = store.serialize()
+    with lock:
+        cache[pdf_sha] = entry
+        cache.move_to_end(pdf_sha)
+        while len(cache) > USER_PDF_INDEX_CACHE_SIZE:
+            cache.popitem(last=False)
+    return num_chunks
+
+
+def _ensure_indexed(uploaded_file, pdf_sha: str, cache_dir: str, force: bool = False):
+    """
+    업로드된 PDF를 저장하고 인덱싱
+
+    Args:
+        force: True면 캐시된 인덱스를 무시하고 다시 인덱싱
+
+    Returns:
+        (청크 수, 오류 메시지) - 성공하면 오류 메시지는 None
+    """
+    if st.session_state.rag_system is None:
+        st.session_state.rag_system = get_rag_system(cache_dir, str(knowledge_index_dir))
+    if st.session_state.rag_system is None:
+        return None, "⚠️ RAG 시스템을 초기화할 수 없습니다. API 키를 확인해주세요."
+
+    file_path = f"./data/uploads/{uploaded_file.name}"
+    with open(file_path, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+
+    try:
+        num_chunks = index_uploaded_pdf(st.session_state.rag_system, file_path, pdf_sha, force=force)
+        st.session_state.rag_system.save_user_pdf_index()
+    except Exception as e:
+        return None, f"오류: {e}"
+    return num_chunks, None
+
+
+def _render_message(msg: dict):
+    """채팅 메시지 하나 렌더링 (히스토리 표시와 새 메시지 표시에 공통 사용)"""
+    if msg["role"] == "user":
+        with st.chat_message("user"):
+            st.write(msg["content"])
+    else:
+        with st.chat_message("assistant"):
+            st.write(msg["content"])
+            if "sources" in msg and msg["sources"]:
+                with st.expander("📄 참고 문서 보기"):
+                    # 배경지식 소스 표시
+                    if "knowledge_sources" in msg and msg["knowledge_sources"]:
+                        st.markdown("**📚 배경지식**")
+                        for source in msg["knowledge_sources"]:
+                            st.markdown(f"**[배경지식 청크 {source['index']}] (유사도: {source['score']})**")
+                            st.text(source["text"])
+                            st.divider()
+                    
+                    # PDF 소스 표시
+                    if "pdf_sources" in msg and msg["pdf_sources"]:
+                        st.markdown("**📄 업로드된 문서**")
+                        for source in msg["pdf_sources"]:
+                            st.markdown(f"**[문서 청크 {source['index']}] (유사도: {source['score']})**")
+                            st.text(source["text"])
+                            st.divider()
+                    
+                    # 기존 소스 구조 호환성 (혹시 모를 경우)
+                    if not ("knowledge_sources" in msg or "pdf_sources" in msg):
+                        for i, source in enumerate(msg["sources"], 1):
+                            st.markdown(f"**[청크 {source['index']}] (유사도: {source['score']})**")
+                            st.text(source["text"])
+                            st.divider()
 
 
 # 페이지 설정
@@ -84,12 +200,12 @@ if "knowledge_loaded" not in st.session_state:
     st.session_state.knowledge_loaded = False
 if "uploader_key" not in st.session_state:
     st.session_state.uploader_key = "uploader-0"
+if "last_pdf_sha" not in st.session_state:
+    st.session_state.last_pdf_sha = None
 
 # 인덱스 파일 존재 여부 확인 (배경지식과 사용자 PDF 분리)
 knowledge_index_dir = Path("./data/knowledge_vectorstore")
-user_pdf_index_dir = Path("./data/user_pdf_vectorstore")
-has_knowledge_index = (knowledge_index_dir / "index.faiss").exists() and (knowledge_index_dir / "chunks.pkl").exists()
-has_user_pdf_index = (user_pdf_index_dir / "index.faiss").exists() and (user_pdf_index_dir / "chunks.pkl").exists()
+has_knowledge_index = VectorStore.exists(knowledge_index_dir)
 # 레거시 인덱스 관련 로직 제거됨
 
 # 제목
@@ -114,7 +230,7 @@ with st.sidebar:
         st.info(f"""
         **필요한 파일:**
         - {knowledge_index_dir}/index.faiss
-        - {knowledge_index_dir}/chunks.pkl
+        - {knowledge_index_dir}/chunks.arrow (또는 chunks.pkl)
         
         **생성 방법:**
         ```bash
@@ -127,85 +243,40 @@ with st.sidebar:
     if st.session_state.rag_system is None:
         with st.spinner("📚 배경지식 로딩 중..."):
             cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "./models")
-            st.session_state.rag_system = get_rag_system(cache_dir)
+            try:
+                # 배경지식 인덱스는 get_rag_system에서 함께 로드됨 (실패하면 캐시하지 않고 다음 세션에서 재시도)
+                st.session_state.rag_system = get_rag_system(cache_dir, str(knowledge_index_dir))
+            except RuntimeError as e:
+                st.error(str(e))
+                st.stop()
             if st.session_state.rag_system is not None:
-                try:
-                    st.session_state.rag_system.load_knowledge_index()
-                    st.session_state.knowledge_loaded = True
-                    st.success("✅ 배경지식 로드 완료")
-                except Exception as e:
-                    st.error(f"배경지식 로드 실패: {e}")
-                    st.stop()
+                st.session_state.knowledge_loaded = True
+                st.success("✅ 배경지식 로드 완료")
 
     if uploaded_file:
-        # 파일이 업로드되면 자동으로 인덱싱 시작
-        file_path = f"./data/uploads/{uploaded_file.name}"
-        
-        # 같은 파일이 이미 업로드되어 있는지 확인
-        if not os.path.exists(file_path) or os.path.getsize(file_path) != uploaded_file.size:
-            # 파일 저장
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            # 자동 인덱싱 진행
+        # 파일이 업로드되면 자동으로 인덱싱 시작 (이 세션에서 이미 인덱싱한 내용이면 버튼으로만 다시 인덱싱)
+        pdf_sha = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        if st.session_state.indexed and st.session_state.last_pdf_sha == pdf_sha:
+            st.info("📄 이미 업로드된 파일입니다. 인덱싱을 다시 시작하려면 '인덱싱 다시 시작' 버튼을 클릭하세요.")
+            force = st.button("🔄 인덱싱 다시 시작", type="secondary")
+            should_index = force
+        else:
+            force = False
+            should_index = True
+
+        if should_index:
             with st.spinner("📄 파일 업로드 및 인덱싱 중... (1-2분 소요)"):
                 cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "./models")
-                if st.session_state.rag_system is None:
-                    st.session_state.rag_system = get_rag_system(cache_dir)
-                
-                if st.session_state.rag_system is None:
-                    st.error("⚠️ RAG 시스템을 초기화할 수 없습니다. API 키를 확인해주세요.")
-                else:
-                    try:
-                        num_chunks = st.session_state.rag_system.index_user_pdf(file_path)
-                        st.session_state.rag_system.save_user_pdf_index()
-                        st.session_state.indexed = True
-                        st.success(f"✅ 업로드 및 인덱싱 완료! ({num_chunks}개 청크)")
-                        st.session_state.uploader_key = f"uploader-{int(time.time())}"
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"오류: {e}")
-        else:
-            # 이미 같은 파일이 있는 경우: 사용자 인덱스 존재 여부 확인
-            if has_user_pdf_index:
-                st.info("📄 이미 업로드된 파일입니다. 인덱싱을 다시 시작하려면 '인덱싱 다시 시작' 버튼을 클릭하세요.")
-                if st.button("🔄 인덱싱 다시 시작", type="secondary"):
-                    with st.spinner("📄 인덱싱 다시 시작... (1-2분 소요)"):
-                        cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "./models")
-                        if st.session_state.rag_system is None:
-                            st.session_state.rag_system = get_rag_system(cache_dir)
-                        
-                        if st.session_state.rag_system is None:
-                            st.error("⚠️ RAG 시스템을 초기화할 수 없습니다. API 키를 확인해주세요.")
-                        else:
-                            try:
-                                num_chunks = st.session_state.rag_system.index_user_pdf(file_path)
-                                st.session_state.rag_system.save_user_pdf_index()
-                                st.session_state.indexed = True
-                                st.success(f"✅ 인덱싱 완료! ({num_chunks}개 청크)")
-                                st.session_state.uploader_key = f"uploader-{int(time.time())}"
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"오류: {e}")
+                num_chunks, error = _ensure_indexed(uploaded_file, pdf_sha, cache_dir, force=force)
+
+            if error:
+                st.error(error)
             else:
-                # 파일은 있으나 사용자 인덱스가 없으면 즉시 인덱싱 수행
-                with st.spinner("📄 인덱싱 중... (1-2분 소요)"):
-                    cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "./models")
-                    if st.session_state.rag_system is None:
-                        st.session_state.rag_system = get_rag_system(cache_dir)
-                    
-                    if st.session_state.rag_system is None:
-                        st.error("⚠️ RAG 시스템을 초기화할 수 없습니다. API 키를 확인해주세요.")
-                    else:
-                        try:
-                            num_chunks = st.session_state.rag_system.index_user_pdf(file_path)
-                            st.session_state.rag_system.save_user_pdf_index()
-                            st.session_state.indexed = True
-                            st.success(f"✅ 인덱싱 완료! ({num_chunks}개 청크)")
-                            st.session_state.uploader_key = f"uploader-{int(time.time())}"
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"오류: {e}")
+                st.session_state.indexed = True
+                st.session_state.last_pdf_sha = pdf_sha
+                st.success(f"✅ 업로드 및 인덱싱 완료! ({num_chunks}개 청크)")
+                # 다음 실행부터 업로더를 비움 (즉시 다시 실행하지 않고 아래 상태 표시까지 이어서 렌더링)
+                st.session_state.uploader_key = f"uploader-{int(time.time())}"
 
     st.divider()
 
@@ -233,36 +304,7 @@ if True:  # 배경지식이 항상 로드되므로 항상 활성화
 
     # 채팅 히스토리 표시
     for msg in st.session_state.chat_history:
-        if msg["role"] == "user":
-            with st.chat_message("user"):
-                st.write(msg["content"])
-        else:
-            with st.chat_message("assistant"):
-                st.write(msg["content"])
-                if "sources" in msg and msg["sources"]:
-                    with st.expander("📄 참고 문서 보기"):
-                        # 배경지식 소스 표시
-                        if "knowledge_sources" in msg and msg["knowledge_sources"]:
-                            st.markdown("**📚 배경지식**")
-                            for source in msg["knowledge_sources"]:
-                                st.markdown(f"**[배경지식 청크 {source['index']}] (유사도: {source['score']})**")
-                                st.text(source["text"])
-                                st.divider()
-                        
-                        # PDF 소스 표시
-                        if "pdf_sources" in msg and msg["pdf_sources"]:
-                            st.markdown("**📄 업로드된 문서**")
-                            for source in msg["pdf_sources"]:
-                                st.markdown(f"**[문서 청크 {source['index']}] (유사도: {source['score']})**")
-                                st.text(source["text"])
-                                st.divider()
-                        
-                        # 기존 소스 구조 호환성 (혹시 모를 경우)
-                        if not ("knowledge_sources" in msg or "pdf_sources" in msg):
-                            for i, source in enumerate(msg["sources"], 1):
-                                st.markdown(f"**[청크 {source['index']}] (유사도: {source['score']})**")
-                                st.text(source["text"])
-                                st.divider()
+        _render_message(msg)
 
     # 입력창
     user_input = st.chat_input("질문을 입력하세요...")
@@ -271,14 +313,16 @@ if True:  # 배경지식이 항상 로드되므로 항상 활성화
         # RAG 시스템이 없으면 초기화
         if st.session_state.rag_system is None:
             cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "./models")
-            st.session_state.rag_system = get_rag_system(cache_dir)
+            st.session_state.rag_system = get_rag_system(cache_dir, str(knowledge_index_dir))
             
             if st.session_state.rag_system is None:
                 st.error("⚠️ RAG 시스템을 초기화할 수 없습니다. API 키를 확인해주세요.")
                 st.stop()
 
-        # 사용자 메시지 추가
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
+        # 사용자 메시지 추가 (전체를 다시 실행하지 않고 히스토리 아래에 바로 표시)
+        user_msg = {"role": "user", "content": user_input}
+        st.session_state.chat_history.append(user_msg)
+        _render_message(user_msg)
 
         # RAG 검색 및 답변 생성 (PDF 업로드 여부에 따라 다른 방식 사용)
         with st.spinner("답변 생성 중..."):
@@ -291,17 +335,15 @@ if True:  # 배경지식이 항상 로드되므로 항상 활성화
 
         # AI 응답 추가 (배경지식과 PDF 소스를 통합)
         all_sources = result.get("knowledge_sources", []) + result.get("pdf_sources", [])
-        st.session_state.chat_history.append(
-            {
-                "role": "assistant",
-                "content": result["answer"],
-                "sources": all_sources,
-                "knowledge_sources": result.get("knowledge_sources", []),
-                "pdf_sources": result.get("pdf_sources", [])
-            }
-        )
-
-        st.rerun()
+        assistant_msg = {
+            "role": "assistant",
+            "content": result["answer"],
+            "sources": all_sources,
+            "knowledge_sources": result.get("knowledge_sources", []),
+            "pdf_sources": result.get("pdf_sources", [])
+        }
+        st.session_state.chat_history.append(assistant_msg)
+        _render_message(assistant_msg)
 
 else:
     # 이 코드는 실행되지 않음 (배경지식이 필수이므로)